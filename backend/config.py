@@ -1,7 +1,11 @@
 # config.py
 import os
 from typing import Dict, List, Optional
-from pydantic import BaseSettings
+try:
+    # pydantic 2 moved BaseSettings into pydantic-settings
+    from pydantic_settings import BaseSettings
+except ImportError:
+    from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     # OpenAI Configuration
@@ -16,6 +20,9 @@ class Settings(BaseSettings):
     vector_db_path: str = "./medical_chroma_db"
     collection_name: str = "medical_guidelines"
 
+    # Retrieval Settings
+    use_cross_encoder: bool = True  # re-score top candidates; downloads the model on first query
+
     # Medical Settings
     medical_institutions: List[str] = ["ASCO", "NCCN", "ESMO", "EULAR", "FDA", "NIH"]
     evidence_levels: List[str] = ["meta_analysis", "systematic_review", "rct", "cohort_study", "case_control", "expert_opinion"]
@@ -1,10 +1,18 @@
 # document_processor.py
 import os
+import atexit
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import pickle
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 import json
 from datetime import datetime
+from functools import cached_property, partial
 
 # Import LangChain components
 try:
@@ -57,6 +65,13 @@ try:
 except ImportError:
     OPENPYLIX_AVAILABLE = False
 
+# orjson encodes large document dumps several times faster than json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 try:
     from pptx import Presentation
     PPTX_AVAILABLE = True
@@ -71,33 +86,40 @@ try:
 except ImportError:
     FALLBACK_AVAILABLE = False
 
+# Upper bound on worker processes used to parse a directory
+MAX_PARSE_WORKERS = 8
+# Files submitted per worker ahead of the consumer
+PARSE_PREFETCH = 2
+
 class DocumentProcessor:
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
         self.logger = logging.getLogger(__name__)
 
-        # Initialize LangChain components
-        self._initialize_langchain_components()
+        # Optional on-disk cache of parsed files, keyed by path, size and mtime
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
 
-    def _initialize_langchain_components(self):
-        """Initialize LangChain components"""
+    @cached_property
+    def embedding_model(self):
+        """Embedding model for metadata enhancement, loaded on first use"""
         if not LANGCHAIN_AVAILABLE:
             self.logger.warning("LangChain not available, using fallback document processing")
-            self.embedding_model = None
-            return
+            return None
 
         if all([Document, RecursiveCharacterTextSplitter, Chroma, HuggingFaceEmbeddings]):
             try:
-                # Initialize embedding model for metadata enhancement
-                self.embedding_model = HuggingFaceEmbeddings(
+                embedding_model = HuggingFaceEmbeddings(
                     model_name='sentence-transformers/all-MiniLM-L6-v2'
                 )
                 self.logger.info("Successfully initialized LangChain components")
+                return embedding_model
             except Exception as e:
                 self.logger.error(f"Failed to initialize LangChain components: {e}")
-                self.embedding_model = None
-        else:
-            self.logger.warning("LangChain components not fully available, using fallback methods")
-            self.embedding_model = None
+                return None
+
+        self.logger.warning("LangChain components not fully available, using fallback methods")
+        return None
 
     def load_document_with_langchain(self, file_path: str) -> Optional[Document]:
         """Load document using appropriate LangChain document loader or fallback"""
@@ -140,6 +162,36 @@ class DocumentProcessor:
             self.logger.error(f"Error loading document {file_path} with LangChain: {e}")
             return None
 
+    def load_document(self, file_path: str) -> Optional[Document]:
+        """Load one file as a Document, falling back to plain text reading without LangChain"""
+        if self.cache_dir:
+            # Go through the parse cache so files parsed by other scripts are reused
+            document = self.load_single(file_path)
+            if not document:
+                return None
+            return Document(
+                page_content=document["content"],
+                metadata=document["langchain_metadata"] or document["metadata"]
+            )
+
+        if LANGCHAIN_AVAILABLE:
+            return self.load_document_with_langchain(file_path)
+
+        text_content = self.extract_text_from_file(file_path)
+        if not text_content:
+            return None
+        return Document(page_content=text_content, metadata=self.extract_metadata_from_file(file_path))
+
+    def load_single(self, file_path: str) -> Optional[Dict]:
+        """Parse one file into the RAG document structure, using the on-disk cache when enabled"""
+        file_path = Path(file_path)
+        document = self._load_cached_document(file_path)
+        if document is None:
+            document = self._process_single_file(file_path)
+            if document:
+                self._save_cached_document(file_path, document)
+        return document
+
     def extract_text_from_file(self, file_path: str) -> str:
         """Extract text using LangChain document loaders or fallback methods"""
         if LANGCHAIN_AVAILABLE:
@@ -166,7 +218,7 @@ class DocumentProcessor:
                 self.logger.warning(f"Cannot process {file_extension} files without LangChain")
                 return ""
 
-    def extract_metadata_from_file(self, file_path: str) -> Dict:
+    def extract_metadata_from_file(self, file_path: str, doc: Optional[Document] = None) -> Dict:
         """Extract metadata from file using LangChain and file system info"""
         try:
             stat = os.stat(file_path)
@@ -184,7 +236,9 @@ class DocumentProcessor:
 
             # Extract document-specific metadata using LangChain if available
             if LANGCHAIN_AVAILABLE:
-                doc = self.load_document_with_langchain(file_path)
+                # Reuse an already loaded document instead of parsing the file again
+                if doc is None:
+                    doc = self.load_document_with_langchain(file_path)
                 if doc and hasattr(doc, 'metadata'):
                     # Merge LangChain metadata with our metadata
                     metadata.update(doc.metadata)
@@ -226,78 +280,202 @@ class DocumentProcessor:
         }
         return loader_mapping.get(file_extension, 'UnknownLoader')
 
-    def process_directory(self, directory_path: str, file_extensions: List[str] = None) -> List[Dict]:
+    def process_directory(self, directory_path: Union[str, Path], file_extensions: List[str] = None) -> List[Dict]:
         """Process all documents in a directory using LangChain loaders or fallbacks"""
+        file_paths = self._find_files(directory_path, file_extensions)
+        results = dict(self._iter_processed_files(file_paths))
+        documents = [results[file_path] for file_path in file_paths if results.get(file_path)]
+
+        processing_method = "LangChain" if LANGCHAIN_AVAILABLE else "Fallback"
+        self.logger.info(f"Successfully processed {len(documents)} documents from {directory_path} using {processing_method}")
+        return documents
+
+    def iter_directory(self, directory_path: Union[str, Path], file_extensions: List[str] = None) -> Iterator[Dict]:
+        """Yield documents from a directory as soon as each file is parsed (completion order)"""
+        file_paths = self._find_files(directory_path, file_extensions)
+        for _, document in self._iter_processed_files(file_paths):
+            if document:
+                yield document
+
+    def _find_files(self, directory_path: Union[str, Path], file_extensions: List[str] = None) -> List[Path]:
+        """List the files in a directory with supported extensions"""
         if file_extensions is None:
             # Support all LangChain-compatible formats
             file_extensions = ['.pdf', '.txt', '.md', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls', '.html', '.htm']
 
-        documents = []
         directory = Path(directory_path)
 
         if not directory.exists():
             self.logger.error(f"Directory does not exist: {directory_path}")
-            return documents
+            return []
 
         # Find all files with specified extensions
-        for file_path in directory.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in file_extensions:
-                try:
-                    # Use LangChain to load the document if available
-                    if LANGCHAIN_AVAILABLE:
-                        doc = self.load_document_with_langchain(str(file_path))
-                        if doc and doc.page_content.strip():
-                            # Extract metadata using LangChain
-                            metadata = self.extract_metadata_from_file(str(file_path))
-
-                            # Create document structure for RAG system with LangChain metadata
-                            document = {
-                                "id": f"langchain_{file_path.stem}_{hash(file_path.name + str(metadata.get('modification_date', ''))) % 1000000}",
-                                "content": doc.page_content,
-                                "source": str(file_path),
-                                "file_name": file_path.name,
-                                "file_type": file_path.suffix,
-                                "metadata": metadata,
-                                "institution": self._extract_institution_from_content(doc.page_content) or "Unknown",
-                                "evidence_level": self._extract_evidence_level_from_content(doc.page_content),
-                                "document_type": self._extract_document_type_from_content(doc.page_content),
-                                "cancer_type": self._extract_cancer_type_from_filename(file_path.name),
-                                "publication_date": metadata.get("creation_date_pdf", metadata.get("creation_date", ""))[:10],
-                                "langchain_metadata": doc.metadata if hasattr(doc, 'metadata') else {}
-                            }
-
-                            documents.append(document)
-                            self.logger.info(f"Processed with LangChain: {file_path.name}")
-                    else:
-                        # Fallback processing for simple text files
-                        text_content = self.extract_text_from_file(str(file_path))
-                        if text_content.strip():
-                            metadata = self.extract_metadata_from_file(str(file_path))
-
-                            document = {
-                                "id": f"fallback_{file_path.stem}_{hash(file_path.name + str(metadata.get('modification_date', ''))) % 1000000}",
-                                "content": text_content,
-                                "source": str(file_path),
-                                "file_name": file_path.name,
-                                "file_type": file_path.suffix,
-                                "metadata": metadata,
-                                "institution": self._extract_institution_from_content(text_content) or "Unknown",
-                                "evidence_level": self._extract_evidence_level_from_content(text_content),
-                                "document_type": self._extract_document_type_from_content(text_content),
-                                "cancer_type": self._extract_cancer_type_from_filename(file_path.name),
-                                "publication_date": metadata.get("creation_date_pdf", metadata.get("creation_date", ""))[:10],
-                                "langchain_metadata": {}
-                            }
-
-                            documents.append(document)
-                            self.logger.info(f"Processed with fallback: {file_path.name}")
+        return [
+            file_path for file_path in directory.rglob('*')
+            if file_path.is_file() and file_path.suffix.lower() in file_extensions
+        ]
 
-                except Exception as e:
-                    self.logger.error(f"Error processing {file_path}: {e}")
+    def _iter_processed_files(self, file_paths: List[Path]) -> Iterator[Tuple[Path, Optional[Dict]]]:
+        """Yield (path, document) pairs, cached files first, then parses as worker processes finish"""
+        misses = []
+        for file_path in file_paths:
+            cached = self._load_cached_document(file_path)
+            if cached is not None:
+                yield file_path, cached
+            else:
+                misses.append(file_path)
+
+        max_workers = min(os.cpu_count() or 1, MAX_PARSE_WORKERS, len(misses))
+        if max_workers <= 1:
+            for file_path in misses:
+                document = self._process_single_file(file_path)
+                if document:
+                    self._save_cached_document(file_path, document)
+                yield file_path, document
+            return
 
-        processing_method = "LangChain" if LANGCHAIN_AVAILABLE else "Fallback"
-        self.logger.info(f"Successfully processed {len(documents)} documents from {directory_path} using {processing_method}")
-        return documents
+        # Only a couple of files per worker are submitted at a time, so a
+        # consumer that stops early leaves little parsing work behind
+        pending = deque(misses)
+        in_flight = {}
+        # Files caught in a worker crash, retried one at a time at the end
+        suspects = deque()
+        retried = set()
+        try:
+            while pending or in_flight or suspects:
+                while pending and len(in_flight) < max_workers * PARSE_PREFETCH:
+                    file_path = pending.popleft()
+                    executor, future = _submit_parse(file_path)
+                    in_flight[future] = (file_path, executor)
+                if not in_flight:
+                    file_path = suspects.popleft()
+                    retried.add(file_path)
+                    executor, future = _submit_parse(file_path)
+                    in_flight[future] = (file_path, executor)
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    file_path, executor = in_flight.pop(future)
+                    try:
+                        document = future.result()
+                    except BrokenProcessPool as e:
+                        # A worker died (e.g. a parser crash) and took every
+                        # in-flight file with it; a file that also breaks the
+                        # pool when parsed alone is the culprit
+                        _reset_pool(executor)
+                        if file_path in retried:
+                            self.logger.error(f"Error processing {file_path}: {e}")
+                        else:
+                            suspects.append(file_path)
+                        continue
+                    except Exception as e:
+                        self.logger.error(f"Error processing {file_path}: {e}")
+                        continue
+                    if document:
+                        self._save_cached_document(file_path, document)
+                    yield file_path, document
+        finally:
+            # On an early stop, drop unstarted files but keep the parses that
+            # finished or are running by caching them when they complete
+            for future, (file_path, _) in in_flight.items():
+                if not future.cancel():
+                    future.add_done_callback(partial(self._cache_finished_parse, file_path))
+
+    def _cache_finished_parse(self, file_path: Path, future):
+        """Cache a worker's parse that finished after its consumer stopped"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        document = future.result()
+        if document:
+            self._save_cached_document(file_path, document)
+
+    def _cache_entry(self, file_path: Path):
+        """Cache file and validity key (size, mtime) for a source file"""
+        stat = file_path.stat()
+        digest = hashlib.sha1(str(file_path.resolve()).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.pkl", (stat.st_size, stat.st_mtime_ns)
+
+    def _load_cached_document(self, file_path: Path) -> Optional[Dict]:
+        """Return the cached parse of a file if it has not changed since"""
+        if not self.cache_dir:
+            return None
+        try:
+            cache_file, key = self._cache_entry(file_path)
+            if not cache_file.exists():
+                return None
+            with open(cache_file, 'rb') as f:
+                cached_key, document = pickle.load(f)
+            return document if cached_key == key else None
+        except Exception as e:
+            self.logger.warning(f"Ignoring unreadable cache entry for {file_path}: {e}")
+            return None
+
+    def _save_cached_document(self, file_path: Path, document: Dict):
+        """Store the parse of a file in the on-disk cache"""
+        if not self.cache_dir:
+            return
+        try:
+            cache_file, key = self._cache_entry(file_path)
+            with open(cache_file, 'wb') as f:
+                pickle.dump((key, document), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self.logger.warning(f"Failed to cache parsed document {file_path}: {e}")
+
+    def _process_single_file(self, file_path: Path) -> Optional[Dict]:
+        """Parse one file into the document structure used by the RAG system"""
+        try:
+            # Use LangChain to load the document if available
+            if LANGCHAIN_AVAILABLE:
+                doc = self.load_document_with_langchain(str(file_path))
+                if doc and doc.page_content.strip():
+                    # Extract metadata using LangChain
+                    metadata = self.extract_metadata_from_file(str(file_path), doc)
+
+                    # Create document structure for RAG system with LangChain metadata
+                    document = {
+                        "id": f"langchain_{file_path.stem}_{hash(file_path.name + str(metadata.get('modification_date', ''))) % 1000000}",
+                        "content": doc.page_content,
+                        "source": str(file_path),
+                        "file_name": file_path.name,
+                        "file_type": file_path.suffix,
+                        "metadata": metadata,
+                        "institution": self._extract_institution_from_content(doc.page_content) or "Unknown",
+                        "evidence_level": self._extract_evidence_level_from_content(doc.page_content),
+                        "document_type": self._extract_document_type_from_content(doc.page_content),
+                        "cancer_type": self._extract_cancer_type_from_filename(file_path.name),
+                        "publication_date": metadata.get("creation_date_pdf", metadata.get("creation_date", ""))[:10],
+                        "langchain_metadata": doc.metadata if hasattr(doc, 'metadata') else {}
+                    }
+
+                    self.logger.info(f"Processed with LangChain: {file_path.name}")
+                    return document
+            else:
+                # Fallback processing for simple text files
+                text_content = self.extract_text_from_file(str(file_path))
+                if text_content.strip():
+                    metadata = self.extract_metadata_from_file(str(file_path))
+
+                    document = {
+                        "id": f"fallback_{file_path.stem}_{hash(file_path.name + str(metadata.get('modification_date', ''))) % 1000000}",
+                        "content": text_content,
+                        "source": str(file_path),
+                        "file_name": file_path.name,
+                        "file_type": file_path.suffix,
+                        "metadata": metadata,
+                        "institution": self._extract_institution_from_content(text_content) or "Unknown",
+                        "evidence_level": self._extract_evidence_level_from_content(text_content),
+                        "document_type": self._extract_document_type_from_content(text_content),
+                        "cancer_type": self._extract_cancer_type_from_filename(file_path.name),
+                        "publication_date": metadata.get("creation_date_pdf", metadata.get("creation_date", ""))[:10],
+                        "langchain_metadata": {}
+                    }
+
+                    self.logger.info(f"Processed with fallback: {file_path.name}")
+                    return document
+
+        except Exception as e:
+            self.logger.error(f"Error processing {file_path}: {e}")
+
+        return None
 
     def _extract_institution_from_content(self, content: str) -> Optional[str]:
         """Extract institution/organization from document content"""
@@ -383,12 +561,16 @@ class DocumentProcessor:
     def save_processed_documents(self, documents: List[Dict], output_file: str = "processed_langchain_documents.json"):
         """Save processed documents to JSON file for backup or further processing"""
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(documents, f, indent=2, ensure_ascii=False)
+            with open(output_file, 'wb') as f:
+                f.write(_dumps_json(documents))
             self.logger.info(f"Saved {len(documents)} processed documents to {output_file}")
         except Exception as e:
             self.logger.error(f"Error saving processed documents: {e}")
 
+    def open_processed_documents_writer(self, output_file: str) -> "ProcessedDocumentsWriter":
+        """Open a writer that streams documents into the same JSON array format as save_processed_documents"""
+        return ProcessedDocumentsWriter(output_file)
+
     def load_processed_documents(self, input_file: str = "processed_langchain_documents.json") -> List[Dict]:
         """Load previously processed documents from JSON file"""
         try:
@@ -428,3 +610,79 @@ class DocumentProcessor:
     def extract_text_from_txt(self, file_path: str) -> str:
         """Backward compatibility method"""
         return self.extract_text_from_file(file_path)
+
+def _dumps_json(data) -> bytes:
+    """Indented UTF-8 JSON, matching json.dump(indent=2, ensure_ascii=False)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+class ProcessedDocumentsWriter:
+    """Append documents to a JSON array file one at a time, without holding them all in memory"""
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.count = 0
+        self._file = open(output_file, 'wb')
+        self._file.write(b'[')
+
+    def write(self, document: Dict):
+        self._file.write(b',\n' if self.count else b'\n')
+        self._file.write(_dumps_json(document))
+        self.count += 1
+
+    def close(self):
+        self._file.write(b'\n]' if self.count else b']')
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Parsing-only DocumentProcessor reused by every task in a worker process
+_worker_processor = None
+
+# Parse worker pool shared by every DocumentProcessor in this process
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+    """Start the shared parse pool on first use; it is shut down at interpreter exit"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=min(os.cpu_count() or 1, MAX_PARSE_WORKERS),
+                initializer=_init_worker
+            )
+            atexit.register(_pool.shutdown, cancel_futures=True)
+        return _pool
+
+def _reset_pool(broken: ProcessPoolExecutor):
+    """Drop a broken shared pool so the next get_pool() starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+def _submit_parse(file_path: Path):
+    """Submit a file to the shared pool, replacing the pool if it has broken"""
+    executor = get_pool()
+    try:
+        return executor, executor.submit(_process_file_in_worker, str(file_path))
+    except BrokenProcessPool:
+        _reset_pool(executor)
+        executor = get_pool()
+        return executor, executor.submit(_process_file_in_worker, str(file_path))
+
+def _init_worker():
+    """Create the worker's DocumentProcessor once, when the worker process starts"""
+    global _worker_processor
+    _worker_processor = DocumentProcessor()
+
+def _process_file_in_worker(file_path: str) -> Optional[Dict]:
+    """Parse one file in a worker process"""
+    return _worker_processor._process_single_file(Path(file_path))
@@ -4,6 +4,7 @@ import asyncio
 from llm_coordinator import LLMCoordinator, QueryComplexity
 from medical_rag import MedicalRAGSystem
 from evidence_ranker import EvidenceBasedRanker
+from config import settings
 import logging
 import json
 import time
@@ -12,7 +13,7 @@ class MedicalGuidedPathController:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.llm_coordinator = LLMCoordinator()
-        self.rag_system = MedicalRAGSystem()
+        self.rag_system = MedicalRAGSystem(use_cross_encoder=settings.use_cross_encoder)
         self.evidence_ranker = EvidenceBasedRanker()
         self.conversation_history = []
 
@@ -92,13 +93,13 @@ class MedicalGuidedPathController:
 
         # Entity-based filters
         if entities.get("diseases"):
-            filters["disease"] = {"$in": entities["diseases"]}
+            filters["disease"] = {"$in": list(entities["diseases"])}
 
         if entities.get("treatments"):
-            filters["treatment"] = {"$in": entities["treatments"]}
+            filters["treatment"] = {"$in": list(entities["treatments"])}
 
         if entities.get("biomarkers"):
-            filters["biomarkers"] = {"$in": entities["biomarkers"]}
+            filters["biomarkers"] = {"$in": list(entities["biomarkers"])}
 
         # Patient context filters
         if patient_context:
@@ -206,7 +207,7 @@ class MedicalGuidedPathController:
             collection_stats = 0
             try:
                 if hasattr(self.rag_system, 'collection') and self.rag_system.collection:
-                    collection_stats = self.rag_system.collection.count()
+                    collection_stats = self.rag_system.count_chunks()
             except Exception:
                 pass
 
@@ -1,11 +1,28 @@
 # medical_rag.py
 import chromadb
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Optional
+from typing import List, Dict, FrozenSet, Iterable, Optional, Tuple
 import pandas as pd
 from datetime import datetime
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from threading import RLock
+import ast
+import asyncio
+import atexit
+import hashlib
+import heapq
+import itertools
+import io
 import json
 import logging
+import os
+import operator
+import re
+import time
+from pathlib import Path
+import numpy as np
 
 # Import LangChain components
 try:
@@ -36,14 +53,313 @@ except ImportError as e:
     HuggingFaceEmbeddings = None
     RecursiveCharacterTextSplitter = None
 
+# Optional ONNX Runtime medical encoder
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Optional fast JSON for legacy entity metadata
+try:
+    import orjson
+    loads_json = orjson.loads
+except ImportError:
+    loads_json = json.loads
+
+# Optional LMDB sidecar for precomputed chunk features
+try:
+    import lmdb
+    import msgpack
+    CHUNK_STORE_AVAILABLE = True
+except ImportError:
+    CHUNK_STORE_AVAILABLE = False
+
+# Optional in-process FAISS index for the hot retrieval path
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+# Optional on-disk cache of chunk embeddings across re-ingestion
+try:
+    import diskcache
+    EMBED_CACHE_AVAILABLE = True
+except ImportError:
+    EMBED_CACHE_AVAILABLE = False
+
+MEDICAL_EMBEDDING_MODEL = 'pritamdeka/S-PubMedBert-MS-MARCO'
+ONNX_MODEL_DIR = "./onnx_model"
+# Dynamic INT8 quantization for CPU inference (small accuracy cost); GPUs use FP16
+ONNX_CPU_INT8 = False
+
+# HNSW settings for the guidelines collection; embeddings are L2-normalized
+# so cosine distance reduces to an inner product
+GUIDELINES_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 100
+}
+
+# Extra candidates fetched from non-cosine collections before cosine re-scoring
+NON_COSINE_OVERFETCH = 3
+
+# Chunks with a cancer_type live in per-cancer-type collections named with
+# this prefix; chunks without one stay in the main guidelines collection
+SHARD_COLLECTION_PREFIX = "medical_guidelines__"
+# Slug length keeping prefix + slug + hash suffix within Chroma's 63-character names
+SHARD_SLUG_LENGTH = 32
+
+# Cross-encoder used to re-score the best candidates after entity re-ranking
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+CROSS_ENCODER_CANDIDATES = 20
+
+CHUNK_STORE_PATH = "./chunk_kv"
+EMBED_CACHE_PATH = "./embed_cache"
+
+# Ingests of more chunks than this are encoded on a SentenceTransformer
+# multi-process pool (one model copy per GPU or CPU worker)
+MULTI_PROCESS_MIN_TEXTS = 2000
+
+# Upper bound on chunk length in characters
+CHUNK_MAX_CHARS = 1500
+
+# Concurrent queries arriving within this many seconds are encoded together
+QUERY_COALESCE_WINDOW = 0.02
+
+FAISS_INDEX_PATH = "./medical_faiss.index"
+FAISS_IDS_PATH = "./medical_faiss_ids.json"
+# Past this many vectors the flat index is replaced by an 8-bit scalar
+# quantized one; the top candidates are re-scored with exact float32 vectors
+FAISS_SQ8_MIN_VECTORS = 100_000
+FAISS_SQ8_TRAIN_SIZE = 100_000
+FAISS_SQ8_CANDIDATES_PER_RESULT = 5
+# Extra FAISS candidates per result when metadata filters are applied after the search
+FAISS_FILTER_OVERFETCH = 10
+# Embeddings read from Chroma per request when rebuilding the FAISS index
+FAISS_REBUILD_PAGE_SIZE = 5000
+
+# Fallback ingest pipeline: queue depth between stages and Chroma write size
+PIPELINE_QUEUE_SIZE = 4
+UPSERT_BATCH_SIZE = 512
+
+# Optional Aho-Corasick matcher for entity extraction
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Rule-based medical entity patterns, matched as lowercase substrings
+MEDICAL_ENTITY_PATTERNS = {
+    "diseases": [
+        'cancer', 'carcinoma', 'adenocarcinoma', 'sarcoma', 'lymphoma', 'leukemia',
+        'melanoma', 'tumor', 'neoplasm', 'malignancy'
+    ],
+    "treatments": [
+        'chemotherapy', 'immunotherapy', 'radiation', 'surgery', 'targeted therapy',
+        'hormone therapy', 'transplant', 'biopsy'
+    ],
+    "drugs": [
+        'tamoxifen', 'methotrexate', 'paclitaxel', 'doxorubicin', 'trastuzumab',
+        'pembrolizumab', 'nivolumab', 'ipilimumab'
+    ],
+    "procedures": [
+        'biopsy', 'surgery', 'resection', 'lumpectomy', 'mastectomy', 'radiation',
+        'imaging', 'scan', 'mri', 'ct scan', 'pet scan'
+    ],
+    "anatomy": [
+        'breast', 'lung', 'colon', 'prostate', 'liver', 'brain', 'lymph node',
+        'bone', 'skin', 'blood'
+    ],
+    "biomarkers": [
+        'her2', 'er positive', 'pr positive', 'egfr', 'alk', 'ros1', 'braf',
+        'pd-l1', 'msi-h', 'tmb high'
+    ]
+}
+
+def build_entity_signature(entities: Dict[str, Iterable[str]]) -> str:
+    """Encode entities compactly for metadata, e.g. diseases:cancer|tumor;drugs:trastuzumab"""
+    return ";".join(
+        f"{category}:{'|'.join(sorted(values))}" for category, values in entities.items() if values
+    )
+
+@lru_cache(maxsize=8192)
+def parse_entity_signature(signature: str) -> Dict[str, FrozenSet[str]]:
+    """Decode an entity signature into per-category frozensets (cached per signature)"""
+    entities = {}
+    for part in signature.split(";"):
+        category, sep, values = part.partition(":")
+        if sep and values:
+            entities[category] = frozenset(values.split("|"))
+    return entities
+
+# Boolean metadata field per known entity, e.g. has_drugs_trastuzumab, so
+# Chroma can pre-filter candidates with a where clause
+ENTITY_FLAG_KEYS = {
+    (category, term): f"has_{category}_{re.sub(r'[^a-z0-9]+', '_', term)}"
+    for category, terms in MEDICAL_ENTITY_PATTERNS.items()
+    for term in terms
+}
+
+def build_entity_flags(entities: Dict[str, Iterable[str]]) -> Dict[str, bool]:
+    """Flatten entities into boolean metadata fields"""
+    return {
+        ENTITY_FLAG_KEYS[(category, term)]: True
+        for category, terms in entities.items()
+        for term in terms
+    }
+
+def build_entity_where(entities: Dict[str, Iterable[str]], filters: Optional[Dict] = None) -> Optional[Dict]:
+    """Build a Chroma where clause matching chunks with any of the entities, combined with filters"""
+    clauses = [{key: True} for key in build_entity_flags(entities)]
+    if not clauses:
+        return None
+    entity_where = clauses[0] if len(clauses) == 1 else {"$or": clauses}
+    if not filters:
+        return entity_where
+    return {"$and": [{key: value} for key, value in filters.items()] + [entity_where]}
+
+# Comparison operators of Chroma where clauses
+WHERE_OPERATORS = {
+    "$eq": operator.eq,
+    "$ne": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+def where_matches(metadata: Dict, where: Dict) -> bool:
+    """Evaluate a Chroma where clause against one chunk's metadata"""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(where_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(where_matches(metadata, clause) for clause in condition):
+                return False
+        else:
+            for op, operand in (condition.items() if isinstance(condition, dict) else [("$eq", condition)]):
+                if op not in WHERE_OPERATORS:
+                    raise ValueError(f"Unsupported where operator: {op}")
+                if key not in metadata:
+                    # Chroma treats a missing key as "not equal to / not in" anything
+                    if op in ("$ne", "$nin"):
+                        continue
+                    return False
+                try:
+                    if not WHERE_OPERATORS[op](metadata[key], operand):
+                        return False
+                except TypeError:
+                    # Values of different types never match, as in Chroma
+                    return False
+    return True
+
+# Paragraphs are runs of non-empty lines separated by blank lines
+PARAGRAPH_PATTERN = re.compile(r'[^\n]+(?:\n[^\n]+)*')
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTL for retrieval results"""
+
+    def __init__(self, max_size: int = 2000, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class QueryEncoderBatcher:
+    """Coalesce queries arriving within a short window into one encoder call"""
+
+    def __init__(self, encode_batch, window: float = 0.02):
+        self.encode_batch = encode_batch
+        self.window = window
+        self._pending = {}
+        self._flush_task = None
+
+    async def encode(self, text: str):
+        loop = asyncio.get_running_loop()
+        future = self._pending.get(text)
+        if future is None:
+            future = loop.create_future()
+            self._pending[text] = future
+            if self._flush_task is None:
+                self._flush_task = loop.create_task(self._flush())
+        return await asyncio.shield(future)
+
+    async def _flush(self):
+        await asyncio.sleep(self.window)
+        pending, self._pending, self._flush_task = self._pending, {}, None
+
+        texts = list(pending)
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(None, self.encode_batch, texts)
+            for text, embedding in zip(texts, embeddings):
+                pending[text].set_result(embedding)
+        except Exception as e:
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(e)
+
 class MedicalRAGSystem:
-    def __init__(self):
+    def __init__(self, use_cross_encoder: bool = True):
         self.logger = logging.getLogger(__name__)
+        self.use_cross_encoder = use_cross_encoder
+        self._cross_encoder = None
+        self._cross_encoder_lock = RLock()
+        self._query_cache = QueryCache(max_size=2000, ttl=600)
+        self._cache_epoch = 0
+        # Query embeddings never go stale for a fixed model
+        self._query_embedding_cache = QueryCache(max_size=4096, ttl=float("inf"))
+        self._query_encoder = QueryEncoderBatcher(self._encode_queries, window=QUERY_COALESCE_WINDOW)
         self._initialize_models()
         self._initialize_vector_store()
+        self._initialize_shards()
+        self._initialize_faiss_index()
+        self._initialize_chunk_store()
+        self._initialize_entity_matcher()
 
     def _initialize_models(self):
         """Initialize embedding models"""
+        self.medical_model_name = MEDICAL_EMBEDDING_MODEL
+        self._onnx_session = None
+        self._onnx_failed = False
+        self._onnx_lock = RLock()
+        self._mp_pool = None
+        self._mp_pool_failed = False
+        self._mp_pool_lock = RLock()
+        self._initialize_embed_cache()
+
         if LANGCHAIN_AVAILABLE:
             try:
                 # Check if we have the required classes
@@ -57,7 +373,8 @@ class MedicalRAGSystem:
                     model_name='sentence-transformers/all-mpnet-base-v2'
                 )
                 self.medical_embedding_model = HuggingFaceEmbeddings(
-                    model_name='pritamdeka/S-PubMedBert-MS-MARCO'
+                    model_name=MEDICAL_EMBEDDING_MODEL,
+                    encode_kwargs={"normalize_embeddings": True, "batch_size": 64}
                 )
                 self.logger.info("Successfully initialized LangChain embedding models")
                 self.use_langchain = True
@@ -67,13 +384,28 @@ class MedicalRAGSystem:
         else:
             self._initialize_fallback_models()
 
+    def _initialize_embed_cache(self):
+        """Open the persistent chunk embedding cache"""
+        self._embed_cache = None
+        if not EMBED_CACHE_AVAILABLE:
+            return
+        try:
+            self._embed_cache = diskcache.Cache(EMBED_CACHE_PATH)
+        except Exception as e:
+            self.logger.error(f"Failed to open embedding cache: {e}")
+
+    def _embed_cache_key(self, text: str) -> str:
+        """Key a chunk embedding by model and whitespace/case-normalized text"""
+        normalized = " ".join(text.split()).lower()
+        return hashlib.sha256(f"{self.medical_model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
     def _initialize_fallback_models(self):
         """Initialize fallback models when LangChain is not available"""
         try:
             # General purpose embedding model
             self.embedding_model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
             # Medical-specific embedding model
-            self.medical_embedding_model = SentenceTransformer('pritamdeka/S-PubMedBert-MS-MARCO')
+            self.medical_embedding_model = SentenceTransformer(MEDICAL_EMBEDDING_MODEL)
             self.logger.info("Successfully initialized fallback embedding models")
             self.use_langchain = False
         except Exception as e:
@@ -81,8 +413,135 @@ class MedicalRAGSystem:
             # Final fallback to simpler model
             self.embedding_model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
             self.medical_embedding_model = self.embedding_model
+            self.medical_model_name = 'sentence-transformers/all-MiniLM-L6-v2'
             self.use_langchain = False
 
+    def _prepare_onnx_model(self, use_gpu: bool) -> Path:
+        """Export the medical model to ONNX and build the optimized variant for this device"""
+        model_dir = Path(ONNX_MODEL_DIR)
+        base_path = model_dir / "model.onnx"
+        if not base_path.exists():
+            from optimum.exporters.onnx import main_export
+            main_export(MEDICAL_EMBEDDING_MODEL, output=ONNX_MODEL_DIR, task="feature-extraction")
+
+        if use_gpu:
+            target_path = model_dir / "model_fp16.onnx"
+        elif ONNX_CPU_INT8:
+            target_path = model_dir / "model_int8.onnx"
+        else:
+            target_path = model_dir / "model_opt.onnx"
+        if target_path.exists():
+            return target_path
+
+        # Fuse attention/LayerNorm/GELU subgraphs for BERT
+        from onnxruntime.transformers.optimizer import optimize_model
+        optimized = optimize_model(str(base_path), model_type="bert", use_gpu=use_gpu)
+        if use_gpu:
+            optimized.convert_float_to_float16(keep_io_types=True)
+            optimized.save_model_to_file(str(target_path))
+        elif ONNX_CPU_INT8:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            optimized_path = model_dir / "model_opt.onnx"
+            optimized.save_model_to_file(str(optimized_path))
+            quantize_dynamic(str(optimized_path), str(target_path), weight_type=QuantType.QInt8)
+        else:
+            optimized.save_model_to_file(str(target_path))
+        return target_path
+
+    def _init_onnx_encoder(self) -> bool:
+        """Load an ONNX Runtime session for the medical model, exporting it on first use"""
+        if self._onnx_session is not None:
+            return True
+        if not ONNX_AVAILABLE or self._onnx_failed or self.medical_model_name != MEDICAL_EMBEDDING_MODEL:
+            return False
+
+        # Ingest and query threads may all arrive here first; only one exports
+        with self._onnx_lock:
+            if self._onnx_session is not None:
+                return True
+            if self._onnx_failed:
+                return False
+
+            try:
+                use_gpu = "CUDAExecutionProvider" in ort.get_available_providers()
+                model_path = self._prepare_onnx_model(use_gpu)
+
+                options = ort.SessionOptions()
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if use_gpu else ["CPUExecutionProvider"]
+
+                session = ort.InferenceSession(str(model_path), options, providers=providers)
+                self._onnx_input_names = {i.name for i in session.get_inputs()}
+                self._onnx_tokenizer = AutoTokenizer.from_pretrained(MEDICAL_EMBEDDING_MODEL)
+
+                # Truncate like the SentenceTransformer model does
+                client = getattr(self.medical_embedding_model, "_client", self.medical_embedding_model)
+                self._onnx_max_length = getattr(client, "max_seq_length", None) or 512
+
+                # Published last: the unlocked check above relies on it
+                self._onnx_session = session
+                self.logger.info(f"Initialized ONNX medical encoder ({model_path.name})")
+                return True
+            except Exception as e:
+                self.logger.warning(f"ONNX medical encoder unavailable, using default encoder: {e}")
+                self._onnx_failed = True
+                return False
+
+    def _encode_onnx(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode texts with ONNX Runtime (mean pooling + L2 normalization)"""
+        embeddings = None
+
+        # Length-sorted batches keep per-batch padding small
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        for start in range(0, len(order), batch_size):
+            batch_idx = order[start:start + batch_size]
+            inputs = self._onnx_tokenizer(
+                [texts[i] for i in batch_idx],
+                padding=True,
+                truncation=True,
+                max_length=self._onnx_max_length,
+                return_tensors="np"
+            )
+            feed = {k: v for k, v in inputs.items() if k in self._onnx_input_names}
+            token_embeddings = self._onnx_session.run(None, feed)[0].astype(np.float32)
+
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+            if embeddings is None:
+                embeddings = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch_idx] = pooled
+
+        return embeddings
+
+    def _encode_queries(self, queries: List[str]) -> List[Tuple[float, ...]]:
+        """Encode a batch of queries with the medical model"""
+        if self._init_onnx_encoder():
+            # Use ONNX Runtime session
+            embeddings = self._encode_onnx(queries, batch_size=len(queries))
+        elif self.use_langchain and hasattr(self.medical_embedding_model, 'embed_documents'):
+            # Use LangChain embedding model
+            embeddings = self.medical_embedding_model.embed_documents(queries)
+        elif hasattr(self.medical_embedding_model, 'encode'):
+            # Use SentenceTransformer directly
+            embeddings = self.medical_embedding_model.encode(
+                queries, convert_to_numpy=True, normalize_embeddings=True
+            )
+        else:
+            # Final fallback - use a simple embedding
+            embeddings = [[0.1] * 384 for _ in queries]  # Dummy embedding
+
+        return [tuple(embedding) for embedding in np.asarray(embeddings, dtype=np.float32).tolist()]
+
+    async def _get_query_embedding(self, query: str) -> Tuple[float, ...]:
+        """Return the query embedding from the exact-text cache, or encode it in a coalesced batch"""
+        embedding = self._query_embedding_cache.get(query)
+        if embedding is None:
+            embedding = await self._query_encoder.encode(query)
+            self._query_embedding_cache.put(query, embedding)
+        return embedding
+
     def _initialize_vector_store(self):
         """Initialize vector database"""
         if LANGCHAIN_AVAILABLE and Chroma and HuggingFaceEmbeddings:
@@ -94,11 +553,12 @@ class MedicalRAGSystem:
                 self.langchain_collection = Chroma(
                     collection_name="medical_guidelines",
                     embedding_function=self.medical_embedding_model,
+                    collection_metadata=GUIDELINES_COLLECTION_METADATA,
                     persist_directory="./medical_chroma_db"
                 )
 
                 # Also maintain direct ChromaDB access for compatibility
-                self.collection = self.chroma_client.get_or_create_collection("medical_guidelines")
+                self.collection = self.langchain_collection._collection
                 self.medical_collection = self.chroma_client.get_or_create_collection("medical_documents")
 
                 self.logger.info("Successfully initialized LangChain vector store")
@@ -111,7 +571,9 @@ class MedicalRAGSystem:
         # Fallback to direct ChromaDB
         try:
             self.chroma_client = chromadb.PersistentClient(path="./medical_chroma_db")
-            self.collection = self.chroma_client.get_or_create_collection("medical_guidelines")
+            self.collection = self.chroma_client.get_or_create_collection(
+                "medical_guidelines", metadata=GUIDELINES_COLLECTION_METADATA
+            )
             self.medical_collection = self.chroma_client.get_or_create_collection("medical_documents")
             self.use_langchain_store = False
             self.langchain_collection = None
@@ -120,107 +582,467 @@ class MedicalRAGSystem:
             self.logger.error(f"Failed to initialize fallback vector database: {e}")
             # Final fallback to in-memory storage
             self.chroma_client = chromadb.EphemeralClient()
-            self.collection = self.chroma_client.get_or_create_collection("medical_guidelines")
+            self.collection = self.chroma_client.get_or_create_collection(
+                "medical_guidelines", metadata=GUIDELINES_COLLECTION_METADATA
+            )
             self.medical_collection = self.chroma_client.get_or_create_collection("medical_documents")
             self.use_langchain_store = False
             self.langchain_collection = None
 
-    def extract_medical_entities(self, text: str) -> Dict[str, List[str]]:
-        """Extract medical entities from text using rule-based approach"""
-        entities = {
-            "diseases": [],
-            "treatments": [],
-            "drugs": [],
-            "procedures": [],
-            "anatomy": [],
-            "biomarkers": []
+    def _initialize_shards(self):
+        """Open the existing per-cancer-type guideline collections"""
+        self._shards = {}
+        try:
+            for collection in self.chroma_client.list_collections():
+                # Older clients return Collection objects, newer ones names
+                name = getattr(collection, "name", collection)
+                if name.startswith(SHARD_COLLECTION_PREFIX):
+                    self._shards[name[len(SHARD_COLLECTION_PREFIX):]] = self.chroma_client.get_collection(name)
+            self.logger.info(f"Initialized {len(self._shards)} cancer-type shards")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize cancer-type shards: {e}")
+
+    @staticmethod
+    def _shard_key(cancer_type) -> str:
+        """Collection-name-safe key for a cancer type ('' when absent)"""
+        if not isinstance(cancer_type, str):
+            return ""
+        normalized = cancer_type.strip().lower()
+        slug = MedicalRAGSystem._shard_slug(normalized)
+        if not slug:
+            return ""
+        # The hash keeps types that share a truncated slug apart, and the key
+        # (hence the collection name) starts and ends alphanumeric as Chroma requires
+        return f"{slug}_{hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:8]}"
+
+    @staticmethod
+    def _shard_slug(text: str) -> str:
+        """Readable part of a shard key: lowercase alphanumeric runs joined by '_'"""
+        return re.sub(r'[^a-z0-9]+', '_', text.lower())[:SHARD_SLUG_LENGTH].strip('_')
+
+    def _get_shard(self, key: str):
+        """Return the collection for a shard key, creating it on first use"""
+        if not key:
+            return self.collection
+        if key not in self._shards:
+            self._shards[key] = self.chroma_client.get_or_create_collection(
+                SHARD_COLLECTION_PREFIX + key, metadata=GUIDELINES_COLLECTION_METADATA
+            )
+        return self._shards[key]
+
+    def _all_collections(self) -> List:
+        return [self.collection, *self._shards.values()]
+
+    def count_chunks(self) -> int:
+        """Number of chunks indexed across the main collection and all shards"""
+        return sum(collection.count() for collection in self._all_collections())
+
+    def _route_collections(self, query: str, filters: Dict = None) -> List:
+        """Pick the collections to search: the main one plus the shards relevant to the query"""
+        if not self._shards:
+            return [self.collection]
+
+        # An explicit cancer_type filter selects its shard
+        if filters and isinstance(filters.get("cancer_type"), str):
+            key = self._shard_key(filters["cancer_type"])
+            return [self.collection] + ([self._shards[key]] if key in self._shards else [])
+
+        # Otherwise route on anatomy named in the query, e.g. "breast" -> breast_cancer
+        anatomy = [self._shard_slug(term) for term in self.extract_medical_entities(query)["anatomy"]]
+        routed = [
+            shard for key, shard in self._shards.items()
+            if any(term and term in key.rsplit('_', 1)[0] for term in anatomy)
+        ]
+        return [self.collection] + (routed or list(self._shards.values()))
+
+    def _write_chunks(self, ids: List[str], texts: List[str], metadatas: List[Dict], embeddings,
+                      upsert: bool = False):
+        """Write chunks to the collection of their cancer type"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            groups.setdefault(self._shard_key(metadata.get("cancer_type")), []).append(i)
+
+        for key, rows in groups.items():
+            collection = self._get_shard(key)
+            write = collection.upsert if upsert else collection.add
+            write(
+                embeddings=embeddings[rows],
+                documents=[texts[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                ids=[ids[i] for i in rows]
+            )
+
+    def _query_collections(self, collections: List, query_embedding: np.ndarray, n_results: int,
+                           where: Dict = None) -> Dict:
+        """Query each collection and k-way merge the hits by cosine distance"""
+        # Queries and new chunks are L2-normalized for cosine space; collections
+        # built in another space (e.g. older L2 ones over unnormalized vectors)
+        # get cosine distances recomputed from their stored embeddings, over a
+        # wider candidate set since their own ranking differs
+        query_vector = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+        per_collection = []
+        for collection in collections:
+            cosine = (collection.metadata or {}).get("hnsw:space", "l2") == "cosine"
+            results = collection.query(
+                query_embeddings=query_embedding,
+                n_results=n_results if cosine else n_results * NON_COSINE_OVERFETCH,
+                where=where or None,
+                include=["metadatas", "documents", "distances"] + ([] if cosine else ["embeddings"])
+            )
+            distances = results["distances"][0]
+            if not cosine and len(distances):
+                stored = np.asarray(results["embeddings"][0], dtype=np.float32)
+                norms = np.maximum(np.linalg.norm(stored, axis=1), 1e-12)
+                distances = (1.0 - (stored @ query_vector) / norms).tolist()
+                # Recomputed distances need not keep the collection's order
+                order = sorted(range(len(distances)), key=distances.__getitem__)
+                results = {
+                    field: [[results[field][0][i] for i in order]]
+                    for field in ("ids", "documents", "metadatas")
+                }
+                distances = [distances[i] for i in order]
+            if len(collections) == 1:
+                return {
+                    "distances": [distances[:n_results]],
+                    **{field: [results[field][0][:n_results]] for field in ("ids", "documents", "metadatas")}
+                }
+            per_collection.append(zip(
+                distances, results["ids"][0], results["documents"][0], results["metadatas"][0]
+            ))
+
+        merged = list(itertools.islice(heapq.merge(*per_collection, key=lambda hit: hit[0]), n_results))
+        return {
+            "distances": [[hit[0] for hit in merged]],
+            "ids": [[hit[1] for hit in merged]],
+            "documents": [[hit[2] for hit in merged]],
+            "metadatas": [[hit[3] for hit in merged]]
+        }
+
+    def _get_from_collections(self, ids: List[str], include: List[str]) -> Dict:
+        """Fetch chunks by id from whichever collections hold them"""
+        stored = {"ids": [], **{field: [] for field in include}}
+        remaining = list(ids)
+        for collection in self._all_collections():
+            if not remaining:
+                break
+            found = collection.get(ids=remaining, include=include)
+            stored["ids"].extend(found["ids"])
+            for field in include:
+                stored[field].extend(found[field])
+            found_ids = set(found["ids"])
+            remaining = [chunk_id for chunk_id in remaining if chunk_id not in found_ids]
+        return stored
+
+    def _initialize_faiss_index(self):
+        """Load the FAISS inner-product index mirroring the guidelines collection"""
+        self._faiss_index = None
+        self._faiss_ids = []
+        self._faiss_id_set = set()
+        self._faiss_lock = RLock()
+        self._faiss_in_sync = False
+        if not FAISS_AVAILABLE:
+            return
+
+        try:
+            if Path(FAISS_INDEX_PATH).exists() and Path(FAISS_IDS_PATH).exists():
+                self._faiss_index = faiss.read_index(FAISS_INDEX_PATH)
+                with open(FAISS_IDS_PATH, 'r', encoding='utf-8') as f:
+                    self._faiss_ids = json.load(f)
+                self._faiss_id_set = set(self._faiss_ids)
+
+            # Only serve from FAISS when it holds exactly what Chroma holds;
+            # otherwise (crash before saving, failed write) rebuild it from Chroma
+            self._faiss_in_sync = len(self._faiss_ids) == self.count_chunks()
+            if not self._faiss_in_sync:
+                self._rebuild_faiss_index()
+            self.logger.info(f"Initialized FAISS index ({len(self._faiss_ids)} vectors, in sync: {self._faiss_in_sync})")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize FAISS index: {e}")
+            self._faiss_index = None
+            self._faiss_in_sync = False
+
+    def _rebuild_faiss_index(self):
+        """Rebuild the FAISS index from the embeddings stored in every collection"""
+        with self._faiss_lock:
+            index, ids = None, []
+            for collection in self._all_collections():
+                offset = 0
+                while True:
+                    page = collection.get(include=["embeddings"], limit=FAISS_REBUILD_PAGE_SIZE, offset=offset)
+                    if not len(page["ids"]):
+                        break
+                    vectors = np.asarray(page["embeddings"], dtype=np.float32)
+                    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                    if index is None:
+                        index = faiss.IndexFlatIP(vectors.shape[1])
+                    index.add(vectors)
+                    ids.extend(page["ids"])
+                    offset += len(page["ids"])
+
+            self._faiss_index = index
+            self._faiss_ids = ids
+            self._faiss_id_set = set(ids)
+            if index is not None and index.ntotal >= FAISS_SQ8_MIN_VECTORS:
+                self._quantize_faiss_index()
+            self._faiss_in_sync = True
+
+        self._save_faiss_index()
+        self.logger.info(f"Rebuilt FAISS index from the vector store ({len(ids)} vectors)")
+
+    def _add_to_faiss(self, ids: List[str], embeddings: np.ndarray):
+        """Mirror newly added chunk embeddings into the FAISS index"""
+        if not FAISS_AVAILABLE:
+            return
+
+        with self._faiss_lock:
+            # Chroma ignores ids it already has, so skip them here too
+            new_rows = [i for i, chunk_id in enumerate(ids) if chunk_id not in self._faiss_id_set]
+            if not new_rows:
+                return
+
+            vectors = np.ascontiguousarray(embeddings[new_rows], dtype=np.float32)
+            # Inner product equals cosine only for unit vectors
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            if self._faiss_index is None:
+                self._faiss_index = faiss.IndexFlatIP(vectors.shape[1])
+            self._faiss_index.add(vectors)
+            for i in new_rows:
+                self._faiss_ids.append(ids[i])
+                self._faiss_id_set.add(ids[i])
+
+            if isinstance(self._faiss_index, faiss.IndexFlat) and self._faiss_index.ntotal >= FAISS_SQ8_MIN_VECTORS:
+                self._quantize_faiss_index()
+
+    def _quantize_faiss_index(self):
+        """Replace the flat index with an 8-bit scalar quantized index trained on its vectors"""
+        flat_index = self._faiss_index
+        vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+
+        sq_index = faiss.IndexScalarQuantizer(
+            flat_index.d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        sq_index.train(vectors[:FAISS_SQ8_TRAIN_SIZE])
+        sq_index.add(vectors)
+        self._faiss_index = sq_index
+        self.logger.info(f"Quantized FAISS index to SQ8 ({sq_index.ntotal} vectors)")
+
+    def _save_faiss_index(self):
+        """Persist the FAISS index and its chunk id mapping"""
+        if self._faiss_index is None:
+            return
+
+        try:
+            with self._faiss_lock:
+                faiss.write_index(self._faiss_index, FAISS_INDEX_PATH)
+                with open(FAISS_IDS_PATH, 'w', encoding='utf-8') as f:
+                    json.dump(self._faiss_ids, f)
+        except Exception as e:
+            self.logger.error(f"Failed to save FAISS index: {e}")
+
+    def _query_faiss(self, query_embedding: np.ndarray, n_results: int, top_k: int, where: Dict = None) -> Dict:
+        """Search FAISS for chunk ids, then fetch documents and metadata from Chroma
+
+        Filters are applied to the fetched metadata, so more candidates are
+        requested when a where clause is given.
+        """
+        with self._faiss_lock:
+            quantized = not isinstance(self._faiss_index, faiss.IndexFlat)
+            k = n_results * FAISS_FILTER_OVERFETCH if where else n_results
+            if quantized:
+                k = max(k, top_k * FAISS_SQ8_CANDIDATES_PER_RESULT)
+            similarities, rows = self._faiss_index.search(query_embedding, k)
+            hits = [(self._faiss_ids[row], float(sim)) for row, sim in zip(rows[0], similarities[0]) if row >= 0]
+
+        include = ["documents", "metadatas", "embeddings"] if quantized else ["documents", "metadatas"]
+        stored = self._get_from_collections([chunk_id for chunk_id, _ in hits], include)
+
+        if where:
+            keep = [where_matches(metadata or {}, where) for metadata in stored["metadatas"]]
+            stored = {
+                field: [value for value, kept in zip(values, keep) if kept]
+                for field, values in stored.items()
+            }
+
+        if quantized and len(stored["ids"]):
+            # Re-score SQ8 candidates with the exact float32 vectors
+            stored_vectors = np.asarray(stored["embeddings"], dtype=np.float32)
+            exact = (stored_vectors @ query_embedding[0]) / np.maximum(np.linalg.norm(stored_vectors, axis=1), 1e-12)
+            exact_by_id = dict(zip(stored["ids"], exact.tolist()))
+            hits = sorted(
+                ((chunk_id, exact_by_id[chunk_id]) for chunk_id, _ in hits if chunk_id in exact_by_id),
+                key=lambda hit: hit[1],
+                reverse=True
+            )[:n_results]
+
+        by_id = {
+            chunk_id: (doc, metadata)
+            for chunk_id, doc, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
         }
 
+        documents, metadatas, distances = [], [], []
+        for chunk_id, similarity in hits:
+            if chunk_id in by_id and len(documents) < n_results:
+                documents.append(by_id[chunk_id][0])
+                metadatas.append(by_id[chunk_id][1])
+                # Cosine distance, matching the Chroma collection's space
+                distances.append(1 - similarity)
+
+        return {"documents": [documents], "metadatas": [metadatas], "distances": [distances]}
+
+    def _initialize_chunk_store(self):
+        """Initialize the LMDB store of precomputed per-chunk features"""
+        self.chunk_store = None
+        if not CHUNK_STORE_AVAILABLE:
+            return
+
+        try:
+            self.chunk_store = lmdb.open(CHUNK_STORE_PATH, map_size=10**11, max_dbs=2)
+            self._chunk_features_db = self.chunk_store.open_db(b"features")
+            self._chunk_kv_db = self.chunk_store.open_db(b"kv_cache")
+            self.logger.info("Successfully initialized chunk feature store")
+        except Exception as e:
+            self.logger.error(f"Failed to initialize chunk feature store: {e}")
+            self.chunk_store = None
+
+    def _store_chunk_features(self, ids: List[str], metadatas: List[Dict], entities: List[Dict]):
+        """Persist entities, quality and recency scores for each chunk keyed by chunk_id"""
+        if self.chunk_store is None:
+            return
+
+        try:
+            with self.chunk_store.begin(write=True, db=self._chunk_features_db) as txn:
+                for chunk_id, metadata, chunk_entities in zip(ids, metadatas, entities):
+                    txn.put(chunk_id.encode(), msgpack.packb({
+                        "entities": chunk_entities,
+                        "quality": metadata.get("quality_score", 0),
+                        "recency": metadata.get("recency_score", 0)
+                    }))
+        except Exception as e:
+            self.logger.error(f"Failed to store chunk features: {e}")
+
+    def _load_chunk_features(self, chunk_ids: List[Optional[str]]) -> Dict[str, Dict]:
+        """Fetch precomputed features for the given chunks in a single read transaction"""
+        features = {}
+        if self.chunk_store is None:
+            return features
+
+        try:
+            with self.chunk_store.begin(db=self._chunk_features_db) as txn:
+                for chunk_id in chunk_ids:
+                    if chunk_id:
+                        packed = txn.get(chunk_id.encode())
+                        if packed is not None:
+                            features[chunk_id] = msgpack.unpackb(packed)
+        except Exception as e:
+            self.logger.error(f"Failed to load chunk features: {e}")
+        return features
+
+    def save_chunk_kv(self, chunk_id: str, past_key_values) -> bool:
+        """Store a chunk's precomputed LLM KV-cache tensors for the generation stage"""
+        if self.chunk_store is None:
+            return False
+
+        try:
+            import torch
+            buffer = io.BytesIO()
+            torch.save(past_key_values, buffer)
+            with self.chunk_store.begin(write=True, db=self._chunk_kv_db) as txn:
+                txn.put(chunk_id.encode(), buffer.getvalue())
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to save KV cache for {chunk_id}: {e}")
+            return False
+
+    def load_chunk_kv(self, chunk_id: str):
+        """Load a chunk's precomputed LLM KV-cache tensors, if stored"""
+        if self.chunk_store is None:
+            return None
+
+        try:
+            import torch
+            with self.chunk_store.begin(db=self._chunk_kv_db) as txn:
+                packed = txn.get(chunk_id.encode())
+            if packed is None:
+                return None
+            return torch.load(io.BytesIO(packed))
+        except Exception as e:
+            self.logger.error(f"Failed to load KV cache for {chunk_id}: {e}")
+            return None
+
+    def _initialize_entity_matcher(self):
+        """Build a single Aho-Corasick automaton over all entity patterns"""
+        self._entity_automaton = None
+        if not AHOCORASICK_AVAILABLE:
+            return
+
+        keyword_categories = {}
+        for category, patterns in MEDICAL_ENTITY_PATTERNS.items():
+            for pattern in patterns:
+                keyword_categories.setdefault(pattern, []).append(category)
+
+        automaton = ahocorasick.Automaton()
+        for pattern, categories in keyword_categories.items():
+            automaton.add_word(pattern, (tuple(categories), pattern))
+        automaton.make_automaton()
+        self._entity_automaton = automaton
+
+    def extract_medical_entities(self, text: str) -> Dict[str, Tuple[str, ...]]:
+        """Extract medical entities from text using rule-based approach, as sorted tuples"""
         text_lower = text.lower()
+        found = {category: set() for category in MEDICAL_ENTITY_PATTERNS}
 
-        # Disease patterns
-        disease_patterns = [
-            'cancer', 'carcinoma', 'adenocarcinoma', 'sarcoma', 'lymphoma', 'leukemia',
-            'melanoma', 'tumor', 'neoplasm', 'malignancy'
-        ]
-        for pattern in disease_patterns:
-            if pattern in text_lower:
-                entities["diseases"].append(pattern)
-
-        # Treatment patterns
-        treatment_patterns = [
-            'chemotherapy', 'immunotherapy', 'radiation', 'surgery', 'targeted therapy',
-            'hormone therapy', 'transplant', 'biopsy'
-        ]
-        for pattern in treatment_patterns:
-            if pattern in text_lower:
-                entities["treatments"].append(pattern)
-
-        # Drug patterns
-        drug_patterns = [
-            'tamoxifen', 'methotrexate', 'paclitaxel', 'doxorubicin', 'trastuzumab',
-            'pembrolizumab', 'nivolumab', 'ipilimumab'
-        ]
-        for pattern in drug_patterns:
-            if pattern in text_lower:
-                entities["drugs"].append(pattern)
-
-        # Procedure patterns
-        procedure_patterns = [
-            'biopsy', 'surgery', 'resection', 'lumpectomy', 'mastectomy', 'radiation',
-            'imaging', 'scan', 'mri', 'ct scan', 'pet scan'
-        ]
-        for pattern in procedure_patterns:
-            if pattern in text_lower:
-                entities["procedures"].append(pattern)
-
-        # Anatomy patterns
-        anatomy_patterns = [
-            'breast', 'lung', 'colon', 'prostate', 'liver', 'brain', 'lymph node',
-            'bone', 'skin', 'blood'
-        ]
-        for pattern in anatomy_patterns:
-            if pattern in text_lower:
-                entities["anatomy"].append(pattern)
-
-        # Biomarker patterns
-        biomarker_patterns = [
-            'her2', 'er positive', 'pr positive', 'egfr', 'alk', 'ros1', 'braf',
-            'pd-l1', 'msi-h', 'tmb high'
-        ]
-        for pattern in biomarker_patterns:
-            if pattern in text_lower:
-                entities["biomarkers"].append(pattern)
+        if self._entity_automaton is None:
+            for category, patterns in MEDICAL_ENTITY_PATTERNS.items():
+                for pattern in patterns:
+                    if pattern in text_lower:
+                        found[category].add(pattern)
+        else:
+            # Single pass over the text, bucketing keyword hits by category
+            for _, (categories, pattern) in self._entity_automaton.iter(text_lower):
+                for category in categories:
+                    found[category].add(pattern)
 
-        return entities
+        return {category: tuple(sorted(patterns)) for category, patterns in found.items()}
 
-    async def ingest_medical_documents(self, documents: List[Dict]):
+    async def ingest_medical_documents(self, documents: Iterable[Dict], batch_size: int = 64,
+                                       device: Optional[str] = None):
         """Ingest medical documents into vector database using LangChain"""
         try:
+            documents = list(documents)
             if self.use_langchain_store and self.langchain_collection:
                 # Use LangChain approach
-                return await self._ingest_with_langchain(documents)
+                result = await self._ingest_with_langchain(documents, batch_size, device)
             else:
                 # Use fallback approach
-                return self._ingest_with_fallback(documents)
+                result = await self._ingest_with_fallback(documents, batch_size, device)
+
+            # Invalidate cached retrieval results
+            self._cache_epoch += 1
+            return result
 
         except Exception as e:
             self.logger.error(f"Failed to ingest documents: {e}")
             return {"success": False, "error": str(e)}
 
-    async def _ingest_with_langchain(self, documents: List[Dict]):
+    async def _ingest_with_langchain(self, documents: List[Dict], batch_size: int = 64,
+                                     device: Optional[str] = None):
         """Ingest documents using LangChain components"""
         try:
             # Check if LangChain components are available
             if not all([Document, RecursiveCharacterTextSplitter, self.langchain_collection]):
                 self.logger.warning("LangChain components not available, falling back to direct method")
-                return self._ingest_with_fallback(documents)
+                return await self._ingest_with_fallback(documents, batch_size, device)
 
             # Convert documents to LangChain Document objects
             langchain_docs = []
             metadatas = []
+            document_entities = {}
 
             for doc in documents:
+                document_entities[doc.get("id", "")] = self.extract_medical_entities(doc["content"])
+
                 # Create LangChain Document
                 langchain_doc = Document(
                     page_content=doc["content"],
@@ -231,10 +1053,11 @@ class MedicalRAGSystem:
                         "evidence_level": doc.get("evidence_level", "unknown"),
                         "publication_date": doc.get("publication_date", ""),
                         "document_type": doc.get("document_type", "guideline"),
-                        "cancer_type": doc.get("cancer_type", ""),
+                        "cancer_type": doc.get("cancer_type") or "",
                         "document_id": doc.get("id", ""),
                         # Convert entities dict to string for LangChain compatibility
-                        "entities_str": str(self.extract_medical_entities(doc["content"]))
+                        "entity_signature": build_entity_signature(document_entities[doc.get("id", "")]),
+                        **build_entity_flags(document_entities[doc.get("id", "")])
                     }
                 )
                 langchain_docs.append(langchain_doc)
@@ -242,7 +1065,7 @@ class MedicalRAGSystem:
 
             # Split documents using LangChain text splitter
             text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1500,
+                chunk_size=CHUNK_MAX_CHARS,
                 chunk_overlap=200,
                 length_function=len,
                 separators=["\n\n", "\n", ". ", " ", ""]
@@ -251,37 +1074,45 @@ class MedicalRAGSystem:
             # Split all documents
             all_splits = text_splitter.split_documents(langchain_docs)
 
-            # Add to LangChain vector store
-            self.langchain_collection.add_documents(all_splits)
-
-            # Also update direct ChromaDB for compatibility
-            chunks = []
-            chunk_metadatas = []
             ids = []
-
             for i, split in enumerate(all_splits):
-                chunks.append(split.page_content)
-                chunk_metadatas.append(split.metadata)
-                ids.append(f"langchain_{split.metadata.get('document_id', 'unknown')}_{i}")
-
-            if chunks:
-                # Generate embeddings using the appropriate method
-                if self.use_langchain and hasattr(self.medical_embedding_model, 'embed_documents'):
-                    # Use LangChain embedding model
-                    embeddings = self.medical_embedding_model.embed_documents(chunks)
-                elif hasattr(self.medical_embedding_model, 'encode'):
-                    # Use SentenceTransformer directly
-                    embeddings = self.medical_embedding_model.encode(chunks).tolist()
-                else:
-                    # Final fallback - use dummy embeddings
-                    embeddings = [[0.1] * 384 for _ in chunks]
-
-                self.collection.add(
-                    embeddings=embeddings,
-                    documents=chunks,
-                    metadatas=chunk_metadatas,
-                    ids=ids
-                )
+                chunk_id = f"langchain_{split.metadata.get('document_id', 'unknown')}_{i}"
+                split.metadata["chunk_id"] = chunk_id
+                ids.append(chunk_id)
+
+            # Embed through the chunk embedding cache instead of letting the store
+            # re-embed every split, then write each split to its cancer-type shard.
+            # Each batch is written in a worker thread while the next one encodes
+            loop = asyncio.get_running_loop()
+            texts = [split.page_content for split in all_splits]
+            metadatas = [split.metadata for split in all_splits]
+            multi_process = len(texts) > MULTI_PROCESS_MIN_TEXTS
+            pending_write = None
+            try:
+                for start in range(0, len(all_splits), UPSERT_BATCH_SIZE):
+                    batch = slice(start, start + UPSERT_BATCH_SIZE)
+                    embeddings = await loop.run_in_executor(
+                        None, self._encode_documents, texts[batch], batch_size, device, multi_process
+                    )
+                    if pending_write is not None:
+                        await pending_write
+                    pending_write = asyncio.ensure_future(asyncio.to_thread(
+                        self._write_and_index, ids[batch], texts[batch], metadatas[batch], embeddings, True
+                    ))
+                if pending_write is not None:
+                    await pending_write
+            finally:
+                # Never leave a write running unobserved if encoding failed
+                if pending_write is not None and not pending_write.done():
+                    await asyncio.wait([pending_write])
+            self._save_faiss_index()
+
+            # Persist precomputed chunk features for retrieval
+            self._store_chunk_features(
+                ids,
+                metadatas,
+                [document_entities[split.metadata.get("document_id", "")] for split in all_splits]
+            )
 
             self.logger.info(f"Successfully ingested {len(documents)} documents with LangChain ({len(all_splits)} chunks)")
             return {"success": True, "chunks_created": len(all_splits), "method": "langchain"}
@@ -289,125 +1120,279 @@ class MedicalRAGSystem:
         except Exception as e:
             self.logger.error(f"LangChain ingestion failed: {e}")
             # Fallback to direct method
-            return self._ingest_with_fallback(documents)
+            return await self._ingest_with_fallback(documents, batch_size, device)
 
-    def _ingest_with_fallback(self, documents: List[Dict]):
-        """Ingest documents using fallback method (original implementation)"""
+    async def _ingest_with_fallback(self, documents: List[Dict], batch_size: int = 64,
+                                    device: Optional[str] = None):
+        """Ingest documents using fallback method as a transform -> embed -> upsert pipeline"""
+        tasks = []
         try:
-            chunks = []
-            metadatas = []
-            ids = []
-
-            for doc in documents:
-                document_chunks = self._chunk_medical_document(doc)
-
-                for i, chunk in enumerate(document_chunks):
-                    chunk_id = f"{doc['id']}_{i}"
-                    chunks.append(chunk["text"])
-
-                    # Enhanced metadata
-                    metadata = {
-                        **chunk["metadata"],
-                        "source": doc.get("source", "unknown"),
-                        "institution": doc.get("institution", "unknown"),
-                        "evidence_level": doc.get("evidence_level", "unknown"),
-                        "publication_date": doc.get("publication_date", ""),
-                        "chunk_index": i,
-                        "document_type": doc.get("document_type", "guideline"),
-                        "document_id": doc.get("id", ""),
-                        # Convert entities for compatibility
-                        "entities_str": str(self.extract_medical_entities(chunk["text"]))
-                    }
-
-                    # Add quality indicators
-                    metadata["quality_score"] = self._calculate_quality_score(metadata)
-                    metadata["recency_score"] = self._calculate_recency_score(metadata.get("publication_date", ""))
-
-                    metadatas.append(metadata)
-                    ids.append(chunk_id)
-
-            # Generate embeddings using medical-specific model
-            if self.use_langchain and hasattr(self.medical_embedding_model, 'embed_documents'):
-                # Use LangChain embedding model
-                embeddings = self.medical_embedding_model.embed_documents(chunks)
-            elif hasattr(self.medical_embedding_model, 'encode'):
-                # Use SentenceTransformer directly
-                embeddings = self.medical_embedding_model.encode(chunks).tolist()
-            else:
-                # Final fallback - use dummy embeddings
-                embeddings = [[0.1] * 384 for _ in chunks]
-
-            # Add to vector store
-            self.collection.add(
-                embeddings=embeddings,
-                documents=chunks,
-                metadatas=metadatas,
-                ids=ids
+            loop = asyncio.get_running_loop()
+            workers = os.cpu_count() or 1
+
+            # Bounded queues give backpressure between stages
+            chunk_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+            embedded_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+            chunk_count = 0
+
+            # Chunks are only known as they stream through, so size the whole
+            # ingest from its text: chunks hold at most CHUNK_MAX_CHARS each.
+            # A multi-process encode is fed upsert-sized batches so each call
+            # gives every worker enough texts
+            multi_process = (
+                sum(len(doc.get("content") or "") for doc in documents) // CHUNK_MAX_CHARS > MULTI_PROCESS_MIN_TEXTS
             )
-
-            self.logger.info(f"Successfully ingested {len(documents)} documents with fallback method ({len(chunks)} chunks)")
-            return {"success": True, "chunks_created": len(chunks), "method": "fallback"}
+            embed_size = UPSERT_BATCH_SIZE if multi_process else batch_size
+
+            with ThreadPoolExecutor(max_workers=workers) as transform_pool, \
+                    ThreadPoolExecutor(max_workers=1) as embed_pool, \
+                    ThreadPoolExecutor(max_workers=1) as upsert_pool:
+
+                async def transform():
+                    # Chunk and annotate documents concurrently, in input order
+                    pending = deque()
+                    for doc in documents:
+                        pending.append(loop.run_in_executor(transform_pool, self._prepare_document_chunks, doc))
+                        if len(pending) >= workers:
+                            await chunk_queue.put(await pending.popleft())
+                    while pending:
+                        await chunk_queue.put(await pending.popleft())
+                    await chunk_queue.put(None)
+
+                async def embed():
+                    buffer = []
+                    while True:
+                        records = await chunk_queue.get()
+                        if records is not None:
+                            buffer.extend(records)
+                        while buffer and (len(buffer) >= embed_size or records is None):
+                            batch, buffer = buffer[:embed_size], buffer[embed_size:]
+                            embeddings = await loop.run_in_executor(
+                                embed_pool, self._encode_documents, [r["text"] for r in batch], batch_size, device,
+                                multi_process
+                            )
+                            await embedded_queue.put((batch, embeddings))
+                        if records is None:
+                            await embedded_queue.put(None)
+                            return
+
+                async def upsert():
+                    nonlocal chunk_count
+                    records, embeddings = [], []
+                    while True:
+                        item = await embedded_queue.get()
+                        if item is not None:
+                            records.extend(item[0])
+                            embeddings.extend(item[1])
+                        if records and (len(records) >= UPSERT_BATCH_SIZE or item is None):
+                            await loop.run_in_executor(upsert_pool, self._upsert_chunks, records, embeddings)
+                            chunk_count += len(records)
+                            records, embeddings = [], []
+                        if item is None:
+                            return
+
+                tasks = [asyncio.create_task(stage()) for stage in (transform, embed, upsert)]
+                await asyncio.gather(*tasks)
+
+            self._save_faiss_index()
+
+            self.logger.info(f"Successfully ingested {len(documents)} documents with fallback method ({chunk_count} chunks)")
+            return {"success": True, "chunks_created": chunk_count, "method": "fallback"}
 
         except Exception as e:
+            for task in tasks:
+                task.cancel()
             self.logger.error(f"Fallback ingestion failed: {e}")
             return {"success": False, "error": str(e)}
 
+    def _prepare_document_chunks(self, doc: Dict) -> List[Dict]:
+        """Chunk a document and build per-chunk metadata, ids and entities"""
+        records = []
+
+        # Quality indicators depend only on document-level fields
+        quality_score = self._calculate_quality_score({
+            "evidence_level": doc.get("evidence_level", "unknown"),
+            "institution": doc.get("institution", "unknown")
+        })
+        recency_score = self._calculate_recency_score(doc.get("publication_date", ""))
+
+        for i, chunk in enumerate(self._chunk_medical_document(doc)):
+            chunk_id = f"{doc['id']}_{i}"
+            entities = self.extract_medical_entities(chunk["text"])
+
+            # Enhanced metadata
+            metadata = {
+                **chunk["metadata"],
+                "source": doc.get("source", "unknown"),
+                "institution": doc.get("institution", "unknown"),
+                "evidence_level": doc.get("evidence_level", "unknown"),
+                "publication_date": doc.get("publication_date", ""),
+                "chunk_index": i,
+                "chunk_id": chunk_id,
+                "document_type": doc.get("document_type", "guideline"),
+                "cancer_type": doc.get("cancer_type") or "",
+                "document_id": doc.get("id", ""),
+                # Convert entities for compatibility
+                "entity_signature": build_entity_signature(entities),
+                **build_entity_flags(entities),
+                # Add quality indicators
+                "quality_score": quality_score,
+                "recency_score": recency_score
+            }
+
+            records.append({"id": chunk_id, "text": chunk["text"], "metadata": metadata, "entities": entities})
+        return records
+
+    def _write_and_index(self, ids: List[str], texts: List[str], metadatas: List[Dict], embeddings,
+                         upsert: bool = False):
+        """Write chunks to their vector store shards and mirror them into FAISS"""
+        try:
+            self._write_chunks(ids, texts, metadatas, embeddings, upsert)
+            self._add_to_faiss(ids, np.asarray(embeddings, dtype=np.float32))
+        except Exception:
+            # Chroma may hold chunks FAISS does not; stop serving from FAISS
+            # until the index is rebuilt on the next start
+            self._faiss_in_sync = False
+            raise
+
+    def _upsert_chunks(self, records: List[Dict], embeddings):
+        """Write embedded chunks to the vector store and the chunk feature store"""
+        ids = [r["id"] for r in records]
+        metadatas = [r["metadata"] for r in records]
+
+        self._write_and_index(ids, [r["text"] for r in records], metadatas, embeddings)
+
+        # Persist precomputed chunk features for retrieval
+        self._store_chunk_features(ids, metadatas, [r["entities"] for r in records])
+
+    def _encode_documents(self, texts: List[str], batch_size: int = 64, device: Optional[str] = None,
+                          multi_process: bool = False):
+        """Embed chunk texts, encoding only those missing from the embedding cache"""
+        if self._embed_cache is None or not texts:
+            return self._encode_texts(texts, batch_size, device, multi_process)
+
+        keys = [self._embed_cache_key(text) for text in texts]
+        embeddings = [None] * len(texts)
+        misses = []
+        for i, key in enumerate(keys):
+            cached = self._embed_cache.get(key)
+            if cached is None:
+                misses.append(i)
+            else:
+                embeddings[i] = np.frombuffer(cached, dtype=np.float32)
+
+        if misses:
+            encoded = np.asarray(
+                self._encode_texts([texts[i] for i in misses], batch_size, device, multi_process), dtype=np.float32
+            )
+            with self._embed_cache.transact():
+                for i, embedding in zip(misses, encoded):
+                    self._embed_cache.set(keys[i], embedding.tobytes())
+                    embeddings[i] = embedding
+
+        return np.stack(embeddings)
+
+    def _sentence_transformer(self):
+        """Return the SentenceTransformer behind the medical embedding model, if any"""
+        model = self.medical_embedding_model
+        if isinstance(model, SentenceTransformer):
+            return model
+        # LangChain HuggingFaceEmbeddings wraps one
+        return getattr(model, "_client", None) or getattr(model, "client", None)
+
+    def _get_multi_process_pool(self):
+        """Start the multi-process encoding pool once, closing it at exit"""
+        with self._mp_pool_lock:
+            if self._mp_pool is None and not self._mp_pool_failed:
+                try:
+                    model = self._sentence_transformer()
+                    self._mp_pool = model.start_multi_process_pool()
+                    atexit.register(model.stop_multi_process_pool, self._mp_pool)
+                except Exception as e:
+                    self.logger.warning(f"Multi-process encoding unavailable: {e}")
+                    self._mp_pool_failed = True
+            return self._mp_pool
+
+    def _encode_texts(self, texts: List[str], batch_size: int = 64, device: Optional[str] = None,
+                      multi_process: bool = False):
+        """Embed chunk texts with the medical model, on the multi-process pool for bulk ingests"""
+        if texts and self._init_onnx_encoder():
+            # Use ONNX Runtime session
+            return self._encode_onnx(texts, batch_size)
+        elif multi_process and self._get_multi_process_pool() is not None:
+            # Shard bulk loads across all devices
+            embeddings = self._sentence_transformer().encode_multi_process(
+                texts, self._mp_pool, batch_size=batch_size
+            )
+            return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        elif self.use_langchain and hasattr(self.medical_embedding_model, 'embed_documents'):
+            # Use LangChain embedding model
+            return self.medical_embedding_model.embed_documents(texts)
+        elif hasattr(self.medical_embedding_model, 'encode'):
+            # Use SentenceTransformer directly; encode() sorts inputs by length
+            # internally so each batch is padded to similar lengths
+            return self.medical_embedding_model.encode(
+                texts,
+                batch_size=batch_size,
+                device=device,
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        else:
+            # Final fallback - use dummy embeddings
+            return [[0.1] * 384 for _ in texts]
+
     def _chunk_medical_document(self, document: Dict) -> List[Dict]:
         """Chunk medical documents with semantic boundaries"""
         text = document["content"]
         chunks = []
 
-        # Medical document specific chunking
-        sections = text.split("\n\n")
-        current_chunk = ""
+        # Medical document specific chunking: paragraphs are runs of non-empty
+        # lines, accumulated in a list buffer and joined once per flush. The
+        # scan runs inside the regex engine; the remaining cost is slicing and
+        # joining paragraph strings, which a compiled loop would not remove
+        buffer = []
+        current_len = 0
         current_section = ""
 
-        for section in sections:
-            section = section.strip()
+        def flush(chunk_type: str):
+            chunks.append({
+                "text": "\n\n".join(buffer),
+                "metadata": {
+                    "section": current_section,
+                    "document_id": document["id"],
+                    "chunk_type": chunk_type
+                }
+            })
+
+        for match in PARAGRAPH_PATTERN.finditer(text):
+            section = match.group().strip()
             if not section:
                 continue
 
             # Check if this is a new section header
-            if section.isupper() and len(section) < 100:
+            if len(section) < 100 and section.isupper():
                 # This is a section header
-                if current_chunk:
-                    chunks.append({
-                        "text": current_chunk,
-                        "metadata": {
-                            "section": current_section,
-                            "document_id": document["id"],
-                            "chunk_type": "section"
-                        }
-                    })
-                current_chunk = section + "\n\n"
+                if buffer:
+                    flush("section")
+                buffer = [section]
+                current_len = len(section) + 2
                 current_section = section
-            else:
+            elif current_len + len(section) < CHUNK_MAX_CHARS:
                 # Add to current chunk
-                if len(current_chunk + section) < 1500:
-                    current_chunk += section + "\n\n"
-                else:
-                    # Chunk is full, save it
-                    if current_chunk:
-                        chunks.append({
-                            "text": current_chunk,
-                            "metadata": {
-                                "section": current_section,
-                                "document_id": document["id"],
-                                "chunk_type": "content"
-                            }
-                        })
-                    current_chunk = section + "\n\n"
+                buffer.append(section)
+                current_len += len(section) + 2
+            else:
+                # Chunk is full, save it
+                if buffer:
+                    flush("content")
+                buffer = [section]
+                current_len = len(section) + 2
 
         # Don't forget the last chunk
-        if current_chunk:
-            chunks.append({
-                "text": current_chunk,
-                "metadata": {
-                    "section": current_section,
-                    "document_id": document["id"],
-                    "chunk_type": "content"
-                }
-            })
+        if buffer:
+            flush("content")
 
         return chunks
 
@@ -445,7 +1430,7 @@ class MedicalRAGSystem:
             return 0.5
 
         try:
-            pub_datetime = datetime.strptime(publication_date, "%Y-%m-%d")
+            pub_datetime = datetime.fromisoformat(publication_date)
             current_date = datetime.now()
             years_diff = (current_date - pub_datetime).days / 365.25
 
@@ -462,48 +1447,70 @@ class MedicalRAGSystem:
         except:
             return 0.5
 
-    async def retrieve_relevant_context(self, query: str, filters: Dict = None, top_k: int = 5) -> List[Dict]:
+    async def retrieve_relevant_context(self, query: str, filters: Dict = None, top_k: int = 5,
+                                        rerank: bool = True) -> List[Dict]:
         """Retrieve relevant medical context using LangChain or fallback methods"""
 
         try:
+            cache_key = (
+                " ".join(query.lower().split()),
+                json.dumps(filters, sort_keys=True, default=str) if filters else "",
+                top_k,
+                rerank,
+                self._cache_epoch
+            )
+            cached_results = self._query_cache.get(cache_key)
+            if cached_results is not None:
+                return list(cached_results)
+
             if self.use_langchain_store and self.langchain_collection:
                 # Use LangChain similarity search
-                return await self._retrieve_with_langchain(query, filters, top_k)
+                results = await self._retrieve_with_langchain(query, filters, top_k, rerank)
             else:
                 # Use fallback retrieval method
-                return self._retrieve_with_fallback(query, filters, top_k)
+                results = await self._retrieve_with_fallback(query, filters, top_k, rerank)
+
+            if results:
+                self._query_cache.put(cache_key, results)
+            return list(results)
 
         except Exception as e:
             self.logger.error(f"Failed to retrieve context: {e}")
             return []
 
-    async def _retrieve_with_langchain(self, query: str, filters: Dict = None, top_k: int = 5) -> List[Dict]:
+    async def _retrieve_with_langchain(self, query: str, filters: Dict = None, top_k: int = 5,
+                                       rerank: bool = True) -> List[Dict]:
         """Retrieve using LangChain similarity search"""
         try:
             # Check if LangChain components are available
             if not self.langchain_collection:
                 self.logger.warning("LangChain collection not available, falling back to direct method")
-                return self._retrieve_with_fallback(query, filters, top_k)
+                return await self._retrieve_with_fallback(query, filters, top_k, rerank)
 
             # Convert filters to LangChain format
             langchain_filters = self._convert_filters_for_langchain(filters)
 
-            # Use LangChain similarity search
-            docs = self.langchain_collection.similarity_search_with_score(
-                query,
-                k=top_k * 3,  # Get more for re-ranking
-                filter=langchain_filters
-            )
+            # Search the shards routed for the query with the cached query embedding,
+            # restricted to chunks sharing an entity with the query when possible
+            query_embedding = np.ascontiguousarray([await self._get_query_embedding(query)], dtype=np.float32)
+            collections = self._route_collections(query, filters)
+            docs = None
+            entity_where = build_entity_where(self.extract_medical_entities(query), langchain_filters)
+            if entity_where:
+                docs = self._query_collections(collections, query_embedding, top_k * 3, entity_where)
+            if docs is None or len(docs["ids"][0]) < top_k:
+                # Get more for re-ranking
+                docs = self._query_collections(collections, query_embedding, top_k * 3, langchain_filters)
 
             # Convert LangChain results to our format
             results = []
-            for doc, score in docs:
+            for document, metadata, score in zip(docs["documents"][0], docs["metadatas"][0], docs["distances"][0]):
                 # Calculate similarity score (1 - normalized distance)
                 similarity_score = 1 - (score / 2)  # Normalize score to 0-1 range
 
                 results.append({
-                    "document": doc.page_content,
-                    "metadata": doc.metadata,
+                    "document": document,
+                    "metadata": metadata,
                     "score": similarity_score,
                     "original_distance": score,
                     "retrieval_method": "langchain"
@@ -512,15 +1519,21 @@ class MedicalRAGSystem:
             # Apply medical entity-aware re-ranking
             reranked_results = self._rerank_with_medical_entities_langchain(query, results)
 
-            # Apply evidence-based filtering
-            filtered_results = self._filter_by_evidence_quality(reranked_results)
+            # Apply evidence-based filtering, keeping enough candidates for the cross-encoder
+            filtered_results = self._filter_by_evidence_quality(reranked_results, self._candidate_limit(top_k, rerank))
+
+            # Apply cross-encoder re-scoring of the best candidates
+            if rerank:
+                filtered_results = await asyncio.get_running_loop().run_in_executor(
+                    None, self._rerank_with_cross_encoder, query, filtered_results
+                )
 
             return filtered_results[:top_k]
 
         except Exception as e:
             self.logger.error(f"LangChain retrieval failed: {e}")
             # Fallback to direct method
-            return self._retrieve_with_fallback(query, filters, top_k)
+            return await self._retrieve_with_fallback(query, filters, top_k, rerank)
 
     def _convert_filters_for_langchain(self, filters: Dict) -> Dict:
         """Convert our filter format to LangChain filter format"""
@@ -540,29 +1553,38 @@ class MedicalRAGSystem:
 
         return langchain_filters
 
-    def _retrieve_with_fallback(self, query: str, filters: Dict = None, top_k: int = 5) -> List[Dict]:
+    async def _retrieve_with_fallback(self, query: str, filters: Dict = None, top_k: int = 5,
+                                      rerank: bool = True) -> List[Dict]:
         """Retrieve using fallback method (original implementation)"""
 
         try:
-            # Generate embedding for query using the appropriate method
-            if self.use_langchain and hasattr(self.medical_embedding_model, 'embed_query'):
-                # Use LangChain embedding model
-                query_embedding = self.medical_embedding_model.embed_query(query)
-                query_embedding = [query_embedding]  # Wrap in list for compatibility
-            elif hasattr(self.medical_embedding_model, 'encode'):
-                # Use SentenceTransformer directly
-                query_embedding = self.medical_embedding_model.encode([query]).tolist()
-            else:
-                # Final fallback - use a simple embedding
-                query_embedding = [[0.1] * 384]  # Dummy embedding
+            # Generate embedding for query (cached and batched)
+            query_embedding = [await self._get_query_embedding(query)]
 
             # Base retrieval with enhanced scoring
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=top_k * 3,  # Get more for re-ranking
-                where=filters,
-                include=["metadatas", "documents", "distances"]
-            )
+            query_embedding = np.ascontiguousarray(query_embedding, dtype=np.float32)
+            results = None
+            if self._faiss_index is not None and self._faiss_in_sync:
+                # Exact inner-product search in-process, with any filters applied
+                # to the candidates' metadata afterwards
+                try:
+                    results = self._query_faiss(query_embedding, top_k * 3, top_k, filters)
+                except ValueError as e:
+                    self.logger.warning(f"Filters not supported by FAISS search, using Chroma: {e}")
+                if results is not None and filters and len(results["documents"][0]) < top_k:
+                    # Too few candidates passed the filters; let Chroma filter the whole store
+                    results = None
+            if results is None:
+                # Restrict to chunks sharing an entity with the query, and fall
+                # back to the plain search when that yields too few candidates
+                collections = self._route_collections(query, filters)
+                results = None
+                entity_where = build_entity_where(self.extract_medical_entities(query), filters)
+                if entity_where:
+                    results = self._query_collections(collections, query_embedding, top_k * 3, entity_where)
+                if results is None or len(results["ids"][0]) < top_k:
+                    # Get more for re-ranking
+                    results = self._query_collections(collections, query_embedding, top_k * 3, filters)
 
             # Convert to our format
             scored_results = []
@@ -584,8 +1606,14 @@ class MedicalRAGSystem:
             # Stage 2: Medical entity-aware re-ranking
             reranked_results = self._rerank_with_medical_entities(query, scored_results)
 
-            # Stage 3: Evidence-based filtering
-            filtered_results = self._filter_by_evidence_quality(reranked_results)
+            # Stage 3: Evidence-based filtering, keeping enough candidates for the cross-encoder
+            filtered_results = self._filter_by_evidence_quality(reranked_results, self._candidate_limit(top_k, rerank))
+
+            # Stage 4: Cross-encoder re-scoring of the best candidates
+            if rerank:
+                filtered_results = await asyncio.get_running_loop().run_in_executor(
+                    None, self._rerank_with_cross_encoder, query, filtered_results
+                )
 
             # Return top results with enhanced metadata
             return filtered_results[:top_k]
@@ -594,86 +1622,121 @@ class MedicalRAGSystem:
             self.logger.error(f"Fallback retrieval failed: {e}")
             return []
 
-    def _rerank_with_medical_entities_langchain(self, query: str, results: List[Dict]) -> List[Dict]:
-        """Re-rank LangChain results based on medical entity matching"""
-        query_entities = self.extract_medical_entities(query)
-
-        for result in results:
-            metadata = result["metadata"]
-            score = result["score"]
-
-            # Get entities from the string format
-            entities_str = metadata.get("entities_str", "{}")
-            try:
-                doc_entities = eval(entities_str) if entities_str != "{}" else {}
-            except:
-                doc_entities = {}
-
-            # Calculate entity overlap
-            entity_overlap = 0
-            for entity_type, entities in query_entities.items():
-                if entities and doc_entities.get(entity_type):
-                    overlap = len(set(entities) & set(doc_entities[entity_type]))
-                    entity_overlap += overlap * 0.1  # Boost per entity match
-
-            score += entity_overlap
-
-            # Boost for quality and recency
-            quality_boost = metadata.get("quality_score", 0) * 0.2
-            recency_boost = metadata.get("recency_score", 0) * 0.1
+    def _parse_entities(self, entities_str: str) -> Dict[str, List[str]]:
+        """Parse legacy entities_str metadata stored as JSON or str(dict)"""
+        if not entities_str or entities_str == "{}":
+            return {}
 
-            score += quality_boost + recency_boost
+        try:
+            return loads_json(entities_str)
+        except ValueError:
+            pass
 
-            result["score"] = score
+        try:
+            return ast.literal_eval(entities_str)
+        except (ValueError, SyntaxError):
+            return {}
 
-        # Sort by final score
-        return sorted(results, key=lambda x: x["score"], reverse=True)
+    def _rerank_with_medical_entities_langchain(self, query: str, results: List[Dict]) -> List[Dict]:
+        """Re-rank LangChain results based on medical entity matching"""
+        return self._rerank_with_medical_entities(query, results)
 
     def _rerank_with_medical_entities(self, query: str, results: List[Dict]) -> List[Dict]:
         """Re-rank results based on medical entity matching (original method)"""
-        query_entities = self.extract_medical_entities(query)
+        if not results:
+            return results
 
-        for result in results:
-            metadata = result["metadata"]
-            score = result["score"]
+        query_entities = self.extract_medical_entities(query)
+        query_sets = {k: frozenset(v) for k, v in query_entities.items() if v}
+        chunk_features = self._load_chunk_features([r["metadata"].get("chunk_id") for r in results])
 
-            # Get entities from the string format
-            entities_str = metadata.get("entities_str", "{}")
-            try:
-                doc_entities = eval(entities_str) if entities_str != "{}" else {}
-            except:
-                doc_entities = {}
+        count = len(results)
+        entity_overlap = np.zeros(count, dtype=np.float64)
+        quality = np.empty(count, dtype=np.float64)
+        recency = np.empty(count, dtype=np.float64)
 
-            # Calculate entity overlap
-            entity_overlap = 0
-            for entity_type, entities in query_entities.items():
-                if entities and doc_entities.get(entity_type):
-                    overlap = len(set(entities) & set(doc_entities[entity_type]))
-                    entity_overlap += overlap * 0.1  # Boost per entity match
+        for i, result in enumerate(results):
+            metadata = result["metadata"]
 
-            score += entity_overlap
+            features = chunk_features.get(metadata.get("chunk_id"))
+            if features:
+                # Use precomputed chunk features
+                doc_entities = features["entities"]
+                quality[i] = features["quality"]
+                recency[i] = features["recency"]
+            elif "entity_signature" in metadata:
+                # Get entities from the compact signature
+                doc_entities = parse_entity_signature(metadata["entity_signature"])
+                quality[i] = metadata.get("quality_score", 0)
+                recency[i] = metadata.get("recency_score", 0)
+            else:
+                # Get entities from the legacy string format
+                doc_entities = self._parse_entities(metadata.get("entities_str", "{}"))
+                quality[i] = metadata.get("quality_score", 0)
+                recency[i] = metadata.get("recency_score", 0)
 
-            # Boost for quality and recency
-            quality_boost = metadata.get("quality_score", 0) * 0.2
-            recency_boost = metadata.get("recency_score", 0) * 0.1
+            # Count entity overlap
+            for entity_type, query_set in query_sets.items():
+                if doc_entities.get(entity_type):
+                    entity_overlap[i] += len(query_set.intersection(doc_entities[entity_type]))
 
-            score += quality_boost + recency_boost
+        # Boost per entity match, then for quality and recency
+        base_scores = np.fromiter((r["score"] for r in results), dtype=np.float64, count=count)
+        scores = base_scores + entity_overlap * 0.1 + quality * 0.2 + recency * 0.1
 
+        for result, score in zip(results, scores.tolist()):
             result["score"] = score
 
-        # Sort by final score
-        return sorted(results, key=lambda x: x["score"], reverse=True)
-
-    def _filter_by_evidence_quality(self, results: List[Dict]) -> List[Dict]:
-        """Filter results based on evidence quality and source authority"""
-        filtered_results = []
-
-        for result in results:
-            metadata = result["metadata"]
-
-            # Quality threshold
-            quality_score = metadata.get("quality_score", 0)
-            if quality_score >= 0.4:  # Minimum quality threshold
-                filtered_results.append(result)
-
-        return sorted(filtered_results, key=lambda x: x["score"], reverse=True)
+        # Left unsorted; _filter_by_evidence_quality selects the top results
+        return results
+
+    def _get_cross_encoder(self):
+        """Lazily load the cross-encoder used for final re-ranking (called from executor threads)"""
+        if self._cross_encoder is None and self.use_cross_encoder:
+            with self._cross_encoder_lock:
+                if self._cross_encoder is None and self.use_cross_encoder:
+                    try:
+                        from sentence_transformers import CrossEncoder
+                        self._cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL)
+                        self.logger.info(f"Initialized cross-encoder {CROSS_ENCODER_MODEL}")
+                    except Exception as e:
+                        self.logger.warning(f"Cross-encoder unavailable, skipping re-ranking: {e}")
+                        self.use_cross_encoder = False
+        return self._cross_encoder
+
+    def _rerank_with_cross_encoder(self, query: str, results: List[Dict]) -> List[Dict]:
+        """Re-rank the best candidates by cross-encoder relevance to the query"""
+        cross_encoder = self._get_cross_encoder()
+        if cross_encoder is None or not results:
+            return results
+
+        candidates = results[:CROSS_ENCODER_CANDIDATES]
+        try:
+            scores = cross_encoder.predict(
+                [(query, result["document"]) for result in candidates],
+                batch_size=len(candidates),
+                convert_to_numpy=True
+            )
+        except Exception as e:
+            self.logger.error(f"Cross-encoder re-ranking failed: {e}")
+            return results
+
+        for result, ce_score in zip(candidates, scores):
+            result["cross_encoder_score"] = float(ce_score)
+
+        return sorted(candidates, key=lambda x: x["cross_encoder_score"], reverse=True)
+
+    def _candidate_limit(self, top_k: int, rerank: bool) -> int:
+        """Number of results to keep before the optional cross-encoder stage"""
+        if rerank and self.use_cross_encoder:
+            return max(top_k, CROSS_ENCODER_CANDIDATES)
+        return top_k
+
+    def _filter_by_evidence_quality(self, results: List[Dict], limit: int) -> List[Dict]:
+        """Filter results based on evidence quality and return the best `limit` by score"""
+        return heapq.nlargest(
+            limit,
+            # Minimum quality threshold
+            (result for result in results if result["metadata"].get("quality_score", 0) >= 0.4),
+            key=lambda x: x["score"]
+        )
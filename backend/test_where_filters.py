@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# Checks that where_matches, used to filter FAISS candidates, selects the same
+# chunks as Chroma's own where filtering
+import sys
+sys.path.insert(0, '.')
+
+import chromadb
+from medical_rag import where_matches
+
+METADATAS = [
+    {"a": 1, "institution": "NCCN", "quality_score": 0.9},
+    {"a": 2, "institution": "ASCO", "quality_score": 0.5},
+    {"institution": "ESMO", "quality_score": 0.3},
+    {"a": 1, "institution": "FDA"},
+    {"a": 3, "cancer_type": "breast cancer", "quality_score": 0.7},
+    {"cancer_type": "", "entity_anatomy": True},
+]
+
+CLAUSES = [
+    {"a": 1},
+    {"a": {"$eq": 1}},
+    {"a": {"$ne": 1}},
+    {"a": {"$gt": 1}},
+    {"a": {"$gte": 2}},
+    {"a": {"$lt": 2}},
+    {"a": {"$lte": 1}},
+    {"a": {"$in": [1, 3]}},
+    {"a": {"$nin": [1, 3]}},
+    {"institution": {"$in": ["NCCN", "ASCO"]}},
+    {"institution": {"$nin": ["NCCN", "ASCO"]}},
+    {"quality_score": {"$gte": 0.4}},
+    {"cancer_type": "breast cancer"},
+    {"cancer_type": {"$ne": "breast cancer"}},
+    {"entity_anatomy": True},
+    {"$and": [{"quality_score": {"$gte": 0.4}}, {"institution": {"$in": ["NCCN", "ASCO", "FDA"]}}]},
+    {"$or": [{"a": {"$ne": 1}}, {"entity_anatomy": True}]},
+]
+
+collection = chromadb.EphemeralClient().get_or_create_collection("where_parity")
+ids = [str(i) for i in range(len(METADATAS))]
+collection.add(ids=ids, embeddings=[[float(i), 1.0] for i in range(len(METADATAS))], metadatas=METADATAS)
+
+failures = 0
+for clause in CLAUSES:
+    expected = sorted(collection.get(where=clause)["ids"])
+    actual = sorted(chunk_id for chunk_id, metadata in zip(ids, METADATAS) if where_matches(metadata, clause))
+    if expected == actual:
+        print(f"✓ {clause}")
+    else:
+        failures += 1
+        print(f"✗ {clause}: Chroma {expected}, where_matches {actual}")
+
+if failures:
+    print(f"{failures} of {len(CLAUSES)} where clauses differ from Chroma")
+    sys.exit(1)
+print("where_matches agrees with Chroma on all clauses")
@@ -1,13 +1,29 @@
+import mmap
 import os
 import sys
 import json
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 import PyPDF2
 from tqdm import tqdm
 
+# PDFium-based extraction is much faster than PyPDF2 when available
+try:
+    import pypdfium2 as pdfium
+    HAS_PDFIUM = True
+except ImportError:
+    HAS_PDFIUM = False
+
+# orjson serializes large extracted texts much faster than the json module
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Add the project root directory to the Python path
 project_root = str(Path(__file__).parent.absolute())
 sys.path.insert(0, project_root)
@@ -46,34 +62,8 @@ class NCCNProcessor:
         }
     
     def extract_text_from_pdf(self, pdf_path: Path) -> Optional[Dict[str, Any]]:
-        """Extract text from a PDF file using PyPDF2 as a fallback."""
-        try:
-            text = []
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                for page in reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text.append(page_text)
-            
-            if not text:
-                logger.warning(f"No text extracted from {pdf_path.name}")
-                return None
-                
-            return {
-                "content": "\n\n".join(text),
-                "metadata": {
-                    **self.base_metadata,
-                    "cancer_type": pdf_path.stem,
-                    "file_name": pdf_path.name,
-                    "file_size": os.path.getsize(pdf_path),
-                    "processing_date": datetime.now().isoformat()
-                }
-            }
-            
-        except Exception as e:
-            logger.error(f"Error extracting text from {pdf_path.name}: {str(e)}")
-            return None
+        """Extract text from a PDF file using pypdfium2, with PyPDF2 as a fallback."""
+        return extract_text_from_pdf(pdf_path, self.base_metadata)
     
     def process_guidelines(self) -> List[Dict]:
         """Process all NCCN guidelines in the directory."""
@@ -82,45 +72,134 @@ class NCCNProcessor:
             logger.warning(f"No PDF files found in {self.nccn_dir}")
             return []
         
-        processed_docs = []
+        results = {}
+        
+        # Parse PDFs in worker processes; each worker writes its own output file
+        pool_kwargs = {"max_tasks_per_child": 16} if sys.version_info >= (3, 11) else {}
+        with ProcessPoolExecutor(max_workers=os.cpu_count(), **pool_kwargs) as executor:
+            futures = {
+                executor.submit(process_pdf, pdf_path, self.output_dir, self.base_metadata): pdf_path
+                for pdf_path in pdf_files
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Processing NCCN Guidelines"):
+                pdf_path = futures[future]
+                try:
+                    results[pdf_path] = future.result()
+                except Exception as e:
+                    logger.error(f"Error processing {pdf_path.name}: {str(e)}", exc_info=True)
+                    results[pdf_path] = {
+                        "file": str(pdf_path),
+                        "status": "error",
+                        "error": str(e)
+                    }
         
-        for pdf_path in tqdm(pdf_files, desc="Processing NCCN Guidelines"):
+        return [results[pdf_path] for pdf_path in pdf_files]
+
+def extract_pages_with_pdfium(pdf_path: Path) -> List[str]:
+    """Extract page texts with pypdfium2, closing each page as it goes."""
+    text = []
+    pdf = pdfium.PdfDocument(str(pdf_path))
+    try:
+        for page in pdf:
+            textpage = page.get_textpage()
             try:
-                logger.info(f"Processing {pdf_path.name}...")
-                
-                # Extract cancer type from filename
-                cancer_type = pdf_path.stem
-                
-                # Use basic PDF extraction
-                doc_data = self.extract_text_from_pdf(pdf_path)
-                if not doc_data:
-                    raise ValueError("Failed to extract text from PDF")
-                
-                # Save the processed text
-                output_file = self.output_dir / f"{cancer_type}_processed.json"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    json.dump(doc_data, f, ensure_ascii=False, indent=2)
-                
-                # RAG system integration will be handled separately
-                
-                processed_docs.append({
-                    "file": pdf_path.name,
-                    "status": "success",
-                    "output_file": str(output_file),
-                    "content_length": len(doc_data["content"])
-                })
-                
-                logger.info(f"Successfully processed {pdf_path.name} (saved to {output_file})")
-                
-            except Exception as e:
-                logger.error(f"Error processing {pdf_path.name}: {str(e)}", exc_info=True)
-                processed_docs.append({
-                    "file": str(pdf_path),
-                    "status": "error",
-                    "error": str(e)
-                })
-        
-        return processed_docs
+                # PDFium uses CRLF line breaks; match PyPDF2's LF output
+                page_text = textpage.get_text_range().replace("\r\n", "\n")
+            finally:
+                textpage.close()
+                page.close()
+            if page_text:
+                text.append(page_text)
+    finally:
+        pdf.close()
+    return text
+
+def extract_pages_with_pypdf2(pdf_path: Path) -> List[str]:
+    """Extract page texts with PyPDF2 from a memory-mapped file."""
+    text = []
+    with open(pdf_path, 'rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        reader = PyPDF2.PdfReader(mm)
+        for page in reader.pages:
+            # Blank pages have no content stream
+            if page.get("/Contents") is None:
+                continue
+            page_text = page.extract_text()
+            if page_text:
+                text.append(page_text)
+    return text
+
+def extract_text_from_pdf(pdf_path: Path, base_metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Extract text from a PDF file using pypdfium2, with PyPDF2 as a fallback."""
+    try:
+        if HAS_PDFIUM:
+            text = extract_pages_with_pdfium(pdf_path)
+        else:
+            text = extract_pages_with_pypdf2(pdf_path)
+        
+        if not text:
+            logger.warning(f"No text extracted from {pdf_path.name}")
+            return None
+            
+        return {
+            "content": "\n\n".join(text),
+            "metadata": {
+                **base_metadata,
+                "cancer_type": pdf_path.stem,
+                "file_name": pdf_path.name,
+                "file_size": os.path.getsize(pdf_path),
+                "processing_date": datetime.now().isoformat()
+            }
+        }
+        
+    except Exception as e:
+        logger.error(f"Error extracting text from {pdf_path.name}: {str(e)}")
+        return None
+
+def write_json(data: Dict[str, Any], output_file: Path) -> None:
+    """Write data as indented UTF-8 JSON, using orjson when available."""
+    if HAS_ORJSON:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+def process_pdf(pdf_path: Path, output_dir: Path, base_metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract one guideline PDF and save it to output_dir (runs in a worker process)."""
+    try:
+        logger.info(f"Processing {pdf_path.name}...")
+        
+        # Extract cancer type from filename
+        cancer_type = pdf_path.stem
+        
+        # Use basic PDF extraction
+        doc_data = extract_text_from_pdf(pdf_path, base_metadata)
+        if not doc_data:
+            raise ValueError("Failed to extract text from PDF")
+        
+        # Save the processed text
+        output_file = output_dir / f"{cancer_type}_processed.json"
+        write_json(doc_data, output_file)
+        
+        # RAG system integration will be handled separately
+        
+        logger.info(f"Successfully processed {pdf_path.name} (saved to {output_file})")
+        
+        return {
+            "file": pdf_path.name,
+            "status": "success",
+            "output_file": str(output_file),
+            "content_length": len(doc_data["content"])
+        }
+        
+    except Exception as e:
+        logger.error(f"Error processing {pdf_path.name}: {str(e)}", exc_info=True)
+        return {
+            "file": str(pdf_path),
+            "status": "error",
+            "error": str(e)
+        }
 
 def main():
     # Check if NCCN directory exists
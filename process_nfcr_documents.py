@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
 # process_nfcr_documents.py
 import asyncio
+import glob
+import itertools
 import logging
 import sys
 import os
+import re
+from contextlib import closing
 from pathlib import Path
+from typing import Optional
+
+# uvloop is a faster drop-in event loop; unavailable on Windows
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
 
 # Add backend directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
@@ -19,12 +31,49 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Batches ingested concurrently; bounded so in-flight embeddings fit in memory
+INGEST_CONCURRENCY = 4
+# Parsed documents buffered between the parser and the ingestion consumer
+DOCUMENT_QUEUE_SIZE = 64
+
 class NFCRDocumentProcessor:
     def __init__(self):
-        self.document_processor = DocumentProcessor()
+        # Parsed files are cached on disk so reruns skip text extraction
+        self.document_processor = DocumentProcessor(cache_dir=str(Path(__file__).parent / ".cache" / "documents"))
         self.controller = None
         self.nccn_dir = Path(__file__).parent / "nccn_guidelines"
         self.nfcr_dir = Path(__file__).parent / "nfcr-documents"
+        self._dirs = (self.nccn_dir, self.nfcr_dir)
+        # directory -> ((file count, newest mtime), documents)
+        self._dir_cache = {}
+
+    def _iter_cached_directory(self, directory: Path):
+        """Yield a directory's documents, parsing once per process and again only after its files change"""
+        mtimes = [path.stat().st_mtime for path in directory.rglob('*') if path.is_file()]
+        signature = (len(mtimes), max(mtimes, default=0.0))
+
+        cached = self._dir_cache.get(directory)
+        if cached and cached[0] == signature:
+            yield from cached[1]
+            return
+
+        documents = []
+        for document in self.document_processor.iter_directory(directory):
+            documents.append(document)
+            yield document
+        # Only a fully consumed directory is cached
+        self._dir_cache[directory] = (signature, documents)
+
+    def _iter_all_documents(self):
+        """Lazily yield documents from both directories, deduplicated by resolved file path"""
+        seen = set()
+        for directory in self._dirs:
+            if directory.exists():
+                for document in self._iter_cached_directory(directory):
+                    source = str(Path(document['source']).resolve())
+                    if source not in seen:
+                        seen.add(source)
+                        yield document
 
     async def initialize_system(self):
         """Initialize the RAG system"""
@@ -36,20 +85,20 @@ class NFCRDocumentProcessor:
             logger.error(f"Failed to initialize RAG system: {e}")
             return False
 
-    async def process_all_documents(self, batch_size: int = 5, save_backup: bool = True):
+    async def process_all_documents(self, batch_size: int = 64, save_backup: bool = True):
         """Process all NCCN guidelines and NFCR documents and ingest them into the RAG system"""
         logger.info("Starting comprehensive document processing...")
 
         # Check directories exist
         directories_to_process = []
         if self.nccn_dir.exists():
-            directories_to_process.append(str(self.nccn_dir))
+            directories_to_process.append(self.nccn_dir)
             logger.info(f"NCCN Guidelines directory found: {self.nccn_dir}")
         else:
             logger.warning(f"NCCN Guidelines directory not found: {self.nccn_dir}")
 
         if self.nfcr_dir.exists():
-            directories_to_process.append(str(self.nfcr_dir))
+            directories_to_process.append(self.nfcr_dir)
             logger.info(f"NFCR Documents directory found: {self.nfcr_dir}")
         else:
             logger.warning(f"NFCR Documents directory not found: {self.nfcr_dir}")
@@ -58,52 +107,102 @@ class NFCRDocumentProcessor:
             logger.error("No document directories found to process")
             return False
 
-        # Process all documents from all directories
-        all_documents = []
-        for directory in directories_to_process:
-            logger.info(f"Processing directory: {directory}")
-            documents = self.document_processor.process_directory(directory)
-            all_documents.extend(documents)
-            logger.info(f"Found {len(documents)} documents in {directory}")
-
-        if not all_documents:
-            logger.error("No documents found to process")
-            return False
-
-        logger.info(f"Total documents found across all directories: {len(all_documents)}")
-
-        # Save backup of processed documents
+        # Save backup of processed documents as they stream past
+        backup = None
         if save_backup:
             backup_file = "processed_all_medical_documents_backup.json"
-            self.document_processor.save_processed_documents(all_documents, backup_file)
-            logger.info(f"Backup saved to {backup_file}")
-
-        # Process documents in batches to avoid memory issues
-        success_count = 0
-        error_count = 0
+            try:
+                backup = self.document_processor.open_processed_documents_writer(backup_file)
+            except Exception as e:
+                logger.error(f"Error opening backup file, continuing without it: {e}")
 
-        for i in range(0, len(all_documents), batch_size):
-            batch = all_documents[i:i + batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1}/{(len(all_documents)-1)//batch_size + 1} ({len(batch)} documents)")
+        # Parse in a worker thread (which fans out to worker processes) and feed
+        # documents through a bounded queue, so ingestion overlaps parsing and
+        # only queued and in-flight batches are held in memory
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=DOCUMENT_QUEUE_SIZE)
 
+        def parse_documents():
+            nonlocal backup
             try:
+                for directory in directories_to_process:
+                    logger.info(f"Processing directory: {directory}")
+                    count = 0
+                    for document in self.document_processor.iter_directory(directory):
+                        # Back up here, off the event loop; a failed backup
+                        # must not stop ingestion
+                        if backup:
+                            try:
+                                backup.write(document)
+                            except Exception as e:
+                                logger.error(f"Error saving backup, continuing without it: {e}")
+                                failed_backup, backup = backup, None
+                                try:
+                                    failed_backup.close()
+                                except Exception:
+                                    pass
+                        # Blocks this thread while the queue is full
+                        asyncio.run_coroutine_threadsafe(queue.put(document), loop).result()
+                        count += 1
+                    logger.info(f"Found {count} documents in {directory}")
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+        semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
+
+        async def ingest_batch(batch_number: int, batch: list) -> bool:
+            try:
+                logger.info("Processing batch %d (%d documents)", batch_number, len(batch))
                 # Ingest batch into RAG system
                 result = await self.controller.update_medical_knowledge(batch)
 
                 if result.get("success", False):
-                    success_count += len(batch)
-                    logger.info(f"Successfully ingested batch: {len(batch)} documents")
-                else:
-                    error_count += len(batch)
-                    logger.error(f"Failed to ingest batch: {result.get('error', 'Unknown error')}")
-
-                # Small delay to avoid overwhelming the system
-                await asyncio.sleep(0.5)
-
+                    logger.info("Successfully ingested batch: %d documents", len(batch))
+                    return True
+                logger.error("Failed to ingest batch: %s", result.get('error', 'Unknown error'))
             except Exception as e:
-                error_count += len(batch)
-                logger.error(f"Error processing batch: {e}")
+                logger.error("Error processing batch: %s", e)
+            finally:
+                semaphore.release()
+            return False
+
+        producer = asyncio.ensure_future(asyncio.to_thread(parse_documents))
+        ingest_tasks = []
+        batch = []
+        total_documents = 0
+        try:
+            while True:
+                document = await queue.get()
+                if document is not None:
+                    batch.append(document)
+                    total_documents += 1
+                if batch and (len(batch) >= batch_size or document is None):
+                    # Keep up to INGEST_CONCURRENCY batches in flight; wait for a slot
+                    await semaphore.acquire()
+                    ingest_tasks.append((len(batch), asyncio.create_task(ingest_batch(len(ingest_tasks) + 1, batch))))
+                    batch = []
+                if document is None:
+                    break
+            await producer
+        except Exception as e:
+            logger.error(f"Error parsing documents: {e}")
+        finally:
+            if backup:
+                try:
+                    await asyncio.to_thread(backup.close)
+                    logger.info(f"Backup saved to {backup_file}")
+                except Exception as e:
+                    logger.error(f"Error saving backup: {e}")
+
+        results = await asyncio.gather(*(task for _, task in ingest_tasks))
+        success_count = sum(batch_len for (batch_len, _), ok in zip(ingest_tasks, results) if ok)
+        error_count = total_documents - success_count
+
+        if not total_documents:
+            logger.error("No documents found to process")
+            return False
 
+        logger.info(f"Total documents found across all directories: {total_documents}")
         logger.info(f"Processing complete! Success: {success_count}, Errors: {error_count}")
 
         # Get system status
@@ -115,21 +214,25 @@ class NFCRDocumentProcessor:
 
         return success_count > 0
 
-    async def process_specific_cancer_types(self, cancer_types: list, batch_size: int = 3):
-        """Process documents for specific cancer types"""
+    async def process_specific_cancer_types(self, cancer_types: list, batch_size: int = 32,
+                                            max_docs: Optional[int] = None):
+        """Process documents for specific cancer types, stopping after max_docs matches if given"""
         logger.info(f"Processing specific cancer types: {cancer_types}")
+        if not cancer_types:
+            logger.warning("No cancer types given")
+            return False
 
-        # Find documents matching cancer types from both directories
-        target_documents = []
-
-        # Check both directories
-        directories = [str(self.nccn_dir), str(self.nfcr_dir)]
-        for directory in directories:
-            if Path(directory).exists():
-                for document in self.document_processor.process_directory(directory):
-                    cancer_type = document.get('cancer_type', '').lower()
-                    if any(ct.lower() in cancer_type for ct in cancer_types):
-                        target_documents.append(document)
+        # Find documents matching cancer types from both directories; one
+        # alternation pattern does the substring match for every type at once
+        pattern = re.compile('|'.join(re.escape(ct.lower()) for ct in cancer_types))
+        matches = (
+            document for document in self._iter_all_documents()
+            if pattern.search((document.get('cancer_type') or '').lower())
+        )
+        # Stops parsing as soon as enough documents have matched; closing the
+        # generator right away cancels parses still queued behind it
+        with closing(matches):
+            target_documents = list(itertools.islice(matches, max_docs))
 
         if not target_documents:
             logger.warning(f"No documents found for cancer types: {cancer_types}")
@@ -137,70 +240,56 @@ class NFCRDocumentProcessor:
 
         logger.info(f"Found {len(target_documents)} documents for specified cancer types")
 
-        # Process in smaller batches for specific cancer types
-        success_count = 0
-
-        for i in range(0, len(target_documents), batch_size):
-            batch = target_documents[i:i + batch_size]
+        # Ingest in batches; the RAG system embeds each batch's chunks together
+        semaphore = asyncio.Semaphore(INGEST_CONCURRENCY)
 
+        async def ingest_batch(batch: list) -> int:
             try:
-                result = await self.controller.update_medical_knowledge(batch)
+                async with semaphore:
+                    result = await self.controller.update_medical_knowledge(batch)
                 if result.get("success", False):
-                    success_count += len(batch)
-                    logger.info(f"Successfully processed {len(batch)} documents for {cancer_types}")
-                else:
-                    logger.error(f"Failed to process batch: {result.get('error')}")
-
-                await asyncio.sleep(0.3)
-
+                    logger.info("Successfully processed %d documents for %s", len(batch), cancer_types)
+                    return len(batch)
+                logger.error("Failed to process batch: %s", result.get('error'))
             except Exception as e:
-                logger.error(f"Error processing cancer-specific batch: {e}")
+                logger.error("Error processing cancer-specific batch: %s", e)
+            return 0
+
+        success_count = sum(await asyncio.gather(*(
+            ingest_batch(target_documents[i:i + batch_size])
+            for i in range(0, len(target_documents), batch_size)
+        )))
 
         logger.info(f"Completed processing {success_count} documents for {cancer_types}")
         return success_count > 0
 
     def list_available_cancer_types(self):
         """List all available cancer types from both directories"""
-        cancer_types = set()
-
-        # Check both directories
-        directories = [str(self.nccn_dir), str(self.nfcr_dir)]
-        for directory in directories:
-            if Path(directory).exists():
-                for document in self.document_processor.process_directory(directory):
-                    ct = document.get('cancer_type')
-                    if ct:
-                        cancer_types.add(ct)
-
-        return sorted(list(cancer_types))
+        return sorted({
+            document['cancer_type'] for document in self._iter_all_documents()
+            if document.get('cancer_type')
+        })
 
     async def test_single_document(self, document_name: str = None):
         """Test processing a single document"""
-        if not document_name:
-            # Pick the first PDF found from either directory
-            for directory in [str(self.nccn_dir), str(self.nfcr_dir)]:
-                if Path(directory).exists():
-                    for file_path in Path(directory).glob("*.pdf"):
-                        document_name = file_path.name
-                        break
-                if document_name:
-                    break
-
-        if not document_name:
-            logger.error("No PDF documents found for testing")
-            return False
+        directories = [directory for directory in self._dirs if directory.exists()]
+        if document_name:
+            # Locate the file in either directory
+            file_path = next(
+                (path for directory in directories
+                 for path in directory.rglob(glob.escape(document_name)) if path.is_file()),
+                None
+            )
+        else:
+            # Use the first PDF found from either directory
+            file_path = next((path for directory in directories for path in directory.glob("*.pdf")), None)
+            if not file_path:
+                logger.error("No PDF documents found for testing")
+                return False
+            document_name = file_path.name
 
-        # Find the document in either directory
-        test_doc = None
-        for directory in [str(self.nccn_dir), str(self.nfcr_dir)]:
-            if Path(directory).exists():
-                documents = self.document_processor.process_directory(directory)
-                for doc in documents:
-                    if doc['file_name'] == document_name:
-                        test_doc = doc
-                        break
-            if test_doc:
-                break
+        # Parse only that one file
+        test_doc = self.document_processor.load_single(str(file_path)) if file_path else None
 
         if not test_doc:
             logger.error(f"Could not process test document: {document_name}")
@@ -274,4 +363,6 @@ async def main():
         logger.error("Document processing failed!")
 
 if __name__ == "__main__":
+    if HAS_UVLOOP:
+        uvloop.install()
     asyncio.run(main())
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import asyncio
+import itertools
 import logging
 import os
 import sys
@@ -7,6 +8,19 @@ import json
 from pathlib import Path
 from typing import Dict, Any, Optional, List
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# uvloop is a faster drop-in event loop; unavailable on Windows
+try:
+    import uvloop
+    HAS_UVLOOP = True
+except ImportError:
+    HAS_UVLOOP = False
+
 # Add backend directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 
@@ -20,9 +34,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Result keys holding the document text rather than metadata
+_EXCLUDE = frozenset(('page_content', 'content'))
+
+def to_json(data, indent: bool = True) -> str:
+    """JSON for log output (indented unless indent=False), using orjson when available"""
+    if HAS_ORJSON:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(data, default=str, option=option).decode()
+    return json.dumps(data, indent=2 if indent else None, default=str)
+
+class _LazyJSON:
+    """Log argument that serializes only when the record is actually formatted"""
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return to_json(self.data)
+
 class TestBreastCancerProcessing:
     def __init__(self):
-        self.doc_processor = DocumentProcessor()
+        # Shares its parse cache with process_nfcr_documents.py
+        self.doc_processor = DocumentProcessor(cache_dir=str(Path(__file__).parent / ".cache" / "documents"))
         self.rag_system = MedicalRAGSystem()
         
     async def initialize(self):
@@ -57,32 +90,30 @@ class TestBreastCancerProcessing:
             return None
             
         logger.info(f"Successfully loaded document with {len(document.page_content)} characters")
-        logger.debug(f"Document metadata: {json.dumps(document.metadata, indent=2, default=str)}")
+        logger.debug("Document metadata: %s", _LazyJSON(document.metadata))
         
         return document
     
     def prepare_document_data(self, document, file_path: str) -> Dict[str, Any]:
         """Prepare document data for ingestion"""
-        doc_data = {
-            "id": "breast_cancer_guidelines_2025",
-            "content": document.page_content,
-            "source": "NCCN Guidelines",
-            "institution": "NCCN",
-            "evidence_level": "1A",
-            "publication_date": "2025-04-17",
-            "document_type": "guideline",
-            "cancer_type": "breast cancer",
-            "title": "NCCN Guidelines for Breast Cancer (v4.2025)",
-            "file_path": file_path,
-            **document.metadata
-        }
+        base_items = (
+            ("id", "breast_cancer_guidelines_2025"),
+            ("content", document.page_content),
+            ("source", "NCCN Guidelines"),
+            ("institution", "NCCN"),
+            ("evidence_level", "1A"),
+            ("publication_date", "2025-04-17"),
+            ("document_type", "guideline"),
+            ("cancer_type", "breast cancer"),
+            ("title", "NCCN Guidelines for Breast Cancer (v4.2025)"),
+            ("file_path", file_path),
+        )
         
-        # Ensure all values are serializable
-        for k, v in doc_data.items():
-            if v is None:
-                doc_data[k] = ""
-                
-        return doc_data
+        # Document metadata overrides the defaults; None becomes "" so all values are serializable
+        return {
+            k: ("" if v is None else v)
+            for k, v in itertools.chain(base_items, document.metadata.items())
+        }
     
     async def test_query(self, query: str, filters: Optional[Dict] = None, top_k: int = 3):
         """Test querying the RAG system"""
@@ -106,21 +137,24 @@ class TestBreastCancerProcessing:
             logger.info(f"Context keys: {list(context.keys())}")
             
             if "documents" in context:
-                docs = context["documents"]
-                logger.info(f"Retrieved {len(docs)} document sets")
+                # Per-result formatting is only worth doing when INFO is emitted
+                if logger.isEnabledFor(logging.INFO):
+                    docs = context["documents"]
+                    logger.info(f"Retrieved {len(docs)} document sets")
                 
-                for i, doc_set in enumerate(docs):
-                    logger.info(f"--- Document Set {i+1} ---")
-                    for j, doc in enumerate(doc_set[:top_k]):
-                        content = doc.get("page_content", doc.get("content", "No content"))
-                        logger.info(f"--- Result {j+1} ---")
-                        logger.info(f"Score: {doc.get('score', 'N/A')}")
-                        logger.info(f"Metadata: {json.dumps({k: v for k, v in doc.items() if k not in ['page_content', 'content']}, default=str)}")
-                        logger.info(f"Content (first 200 chars): {content[:200]}...")
-                        logger.info("---")
+                    for i, doc_set in enumerate(docs):
+                        logger.info(f"--- Document Set {i+1} ---")
+                        for j, doc in enumerate(doc_set[:top_k]):
+                            content = doc.get("page_content", doc.get("content", "No content"))
+                            snippet = content[:200]
+                            logger.info(f"--- Result {j+1} ---")
+                            logger.info(f"Score: {doc.get('score', 'N/A')}")
+                            logger.info(f"Metadata: {to_json({k: v for k, v in doc.items() if k not in _EXCLUDE}, indent=False)}")
+                            logger.info(f"Content (first 200 chars): {snippet}...")
+                            logger.info("---")
             else:
                 logger.warning("No 'documents' key in context")
-                logger.debug(f"Full context: {json.dumps(context, indent=2, default=str)}")
+                logger.debug("Full context: %s", _LazyJSON(context))
                 
         except Exception as e:
             logger.error(f"Error during query: {e}", exc_info=True)
@@ -137,12 +171,15 @@ class TestBreastCancerProcessing:
             
         # Prepare document data
         doc_data = self.prepare_document_data(document, file_path)
+        # doc_data now references the text; release the loader's Document before ingestion
+        del document
         
         # Ingest the document
         logger.info("Ingesting document into RAG system...")
         try:
             result = await self.rag_system.ingest_medical_documents([doc_data])
-            logger.info(f"Ingestion result: {json.dumps(result, indent=2, default=str)}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(f"Ingestion result: {to_json(result)}")
             
             if not result.get("success", False):
                 logger.error(f"Failed to ingest document: {result.get('error', 'Unknown error')}")
@@ -182,4 +219,6 @@ async def main():
         logger.error("Test failed!")
 
 if __name__ == "__main__":
+    if HAS_UVLOOP:
+        uvloop.install()
     asyncio.run(main())